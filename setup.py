@@ -8,4 +8,5 @@ setup(name='synfony',
       install_requires=['flake8',
                         'pygame',
                         'pytest'],
+      extras_require={'numpy': ['numpy']},
       python_requires='~=3.10')
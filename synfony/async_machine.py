@@ -0,0 +1,235 @@
+# async_machine.py
+# in synfony
+
+from synfony.config import Config
+from synfony.enums import OperationCode
+from synfony.machine import Machine
+from synfony.models import BaseRequest, HeartbeatRequest, IdentityRequest
+from synfony.models import ChannelState, MachineAddress
+from synfony.sockets import FRAME_HEADER, FrameDecoder
+from synfony.ui import UI
+from typing import Callable, Dict, List
+
+import asyncio
+
+
+class AsyncMachine(Machine):
+    """The same protocol as `Machine` (and so they may be mixed in a
+        session), but with all of the networking, i.e. accepting, reading,
+        heartbeat fan-out and timeouts, on one `asyncio` event loop, rather
+        than a thread per connection and per send.
+    """
+
+    @classmethod
+    async def read_frame(cls, reader: asyncio.StreamReader) -> bytes:
+        """Read one length-prefixed frame (see `FramedTCPSockets`).
+        """
+        header = await reader.readexactly(FRAME_HEADER.size)
+        (length,) = FRAME_HEADER.unpack(header)
+        if length > Config.FRAME_MAX_LEN:
+            raise ValueError(f'Frame of length {length!s} is longer than '
+                             f'{Config.FRAME_MAX_LEN!s}.')
+        return await reader.readexactly(length)
+
+    @classmethod
+    def check_voted(cls,
+                    machine_addresses: List[MachineAddress],
+                    votes: Dict[int, HeartbeatRequest],
+                    voted: asyncio.Event):
+        """Set `voted` if every machine has voted.
+        """
+        if len(votes) >= len([machine
+                              for machine in machine_addresses
+                              if machine is not None]):
+            voted.set()
+
+    @classmethod
+    async def connect_to_peer(cls,
+                              machine_address: MachineAddress,
+                              other_machine_address: MachineAddress,
+                              writers: Dict[int, asyncio.StreamWriter]):
+        """Connect to another machine and send my `IdentityRequest`, retrying
+            until it is up.
+        """
+        while True:
+            try:
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(other_machine_address.get_host(),
+                                            other_machine_address.get_port()),
+                    Config.TIMEOUT
+                )
+                writer.write(FrameDecoder.encode(
+                    IdentityRequest(
+                        machine_address=machine_address
+                    ).serialize()
+                ))
+                await writer.drain()
+                writers[other_machine_address.get_idx()] = writer
+                return
+            except Exception:
+                await asyncio.sleep(Config.HANDSHAKE_TIMEOUT)
+
+    @classmethod
+    async def listen_client_async(cls,
+                                  reader: asyncio.StreamReader,
+                                  writer: asyncio.StreamWriter,
+                                  machine_addresses: List[MachineAddress],
+                                  votes: Dict[int, HeartbeatRequest],
+                                  voted: asyncio.Event):
+        """Handle an accepted connection: the `IdentityRequest`, then keep
+            the latest `HeartbeatRequest` as that machine's vote; `voted` is
+            set once every machine has voted.
+        """
+        try:
+            request_data = await cls.read_frame(reader)
+            if (BaseRequest.peek_operation_code(request_data) !=
+                    OperationCode.IDENTITY):
+                return
+            machine_address = IdentityRequest.deserialize(
+                request_data
+            ).get_machine_address()
+            idx = machine_address.get_idx()
+            while idx >= len(machine_addresses):
+                machine_addresses.append(None)
+            machine_addresses[idx] = machine_address
+
+            while True:
+                request_data = await cls.read_frame(reader)
+                if (BaseRequest.peek_operation_code(request_data) !=
+                        OperationCode.HEARTBEAT):
+                    continue
+                # lazily, since `async_metronome` only reads the latest one.
+                votes[idx] = HeartbeatRequest.deserialize_lazy(request_data)
+                cls.check_voted(machine_addresses, votes, voted)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @classmethod
+    async def async_metronome(
+            cls,
+            my_idx: int,
+            writers: Dict[int, asyncio.StreamWriter],
+            machine_addresses: List[MachineAddress],
+            ui_manager: UI,
+            votes: Dict[int, HeartbeatRequest],
+            voted: asyncio.Event,
+            choice_func: Callable = ChannelState.choice_func):
+        """The same protocol as `Machine.metronome`, but sends are
+            concurrent writes on the event loop, and (2) ends as soon as
+            every vote is in, rather than polling.
+        """
+        loop = asyncio.get_running_loop()
+        start_t = loop.time()
+
+        request = cls.make_heartbeat(machine_addresses, ui_manager)
+        votes[my_idx] = request
+        cls.check_voted(machine_addresses, votes, voted)
+        frame = FrameDecoder.encode(request.serialize())
+
+        # 1 - send to all
+        async def impl_send_state(i: int, writer: asyncio.StreamWriter):
+            try:
+                writer.write(frame)
+                await asyncio.wait_for(writer.drain(),
+                                       Config.HEARTBEAT_TIMEOUT)
+                return True
+            except Exception:
+                # that guy is down, so reconnect once he is back up.
+                writers.pop(i, None)
+                writer.close()
+                loop.create_task(cls.connect_to_peer(
+                    machine_addresses[my_idx],
+                    machine_addresses[i],
+                    writers
+                ))
+                return False
+
+        sent = {i: loop.create_task(impl_send_state(i, writer))
+                for i, writer in list(writers.items())
+                if i != my_idx}
+
+        # 2 - wait until every vote is in, or it times out
+        try:
+            await asyncio.wait_for(
+                voted.wait(),
+                max(Config.HEARTBEAT_TIMEOUT - (loop.time() - start_t), 0)
+            )
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.gather(*sent.values())
+
+        for i, machine in enumerate(machine_addresses):
+            if machine is not None and i != my_idx:
+                machine.set_status(i in votes and
+                                   i in sent and
+                                   sent[i].result())
+
+        # votes doesn't care about `machine_id`
+        round_votes = list(votes.values())
+        votes.clear()
+        voted.clear()
+
+        # 3 - consensus + `ui_manager.streamer.sync(...)`
+        cls.consensus(round_votes, ui_manager, choice_func)
+
+        # 4 - wait for next
+        await asyncio.sleep(
+            max(Config.HANDSHAKE_INTERVAL - (loop.time() - start_t), 0.01)
+        )
+
+    @classmethod
+    async def async_networking(cls,
+                               idx: int,
+                               machine_addresses: List[MachineAddress],
+                               ui_manager: UI,
+                               choice_func: Callable):
+        """Accept connections, connect to the other machines, and run the
+            `async_metronome` forever, all on the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        machine_address = machine_addresses[idx]
+        writers: Dict[int, asyncio.StreamWriter] = {}
+        votes: Dict[int, HeartbeatRequest] = {}
+        voted = asyncio.Event()
+
+        server = await asyncio.start_server(
+            lambda reader, writer: cls.listen_client_async(reader,
+                                                           writer,
+                                                           machine_addresses,
+                                                           votes,
+                                                           voted),
+            machine_address.get_host(),
+            machine_address.get_port()
+        )
+        [loop.create_task(cls.connect_to_peer(machine_address,
+                                              other_machine_address,
+                                              writers))
+         for other_machine_address in machine_addresses
+         if other_machine_address.get_idx() != idx]
+
+        async with server:
+            while True:
+                await cls.async_metronome(
+                    my_idx=idx,
+                    writers=writers,
+                    machine_addresses=machine_addresses,
+                    ui_manager=ui_manager,
+                    votes=votes,
+                    voted=voted,
+                    choice_func=choice_func
+                )
+
+    @classmethod
+    def networking(cls,
+                   idx: int,
+                   machine_addresses: List[MachineAddress],
+                   ui_manager: UI,
+                   choice_func: Callable = ChannelState.choice_func):
+        """Run `async_networking` on a new event loop.
+        """
+        asyncio.run(cls.async_networking(idx,
+                                         machine_addresses,
+                                         ui_manager,
+                                         choice_func))
@@ -25,19 +25,100 @@ class Config:
         ['10.250.148.84:30100', [0, 1, 2, 3]],
     ]
 
+    DATAGRAM_MAX_LEN = 65507
     INT_MAX_LEN = 1 << 64
     LIST_MAX_LEN = 255
+    FRAME_MAX_LEN = 1 << 20
+    OUTBOUND_QUEUE_LEN = 1
     PACKET_MAX_LEN = 1024
     STR_MAX_LEN = 280
 
+    # which `Machine` runs the networking: 'threads' or 'asyncio'
+    ENGINE = 'threads'
+
+    # multicast the heartbeats to [GROUP:PORT] (see `MulticastUDPSockets`),
+    # rather than sending them over the TCP mesh.
+    MULTICAST_ENABLED = False
+    MULTICAST_GROUP = '239.255.42.99:10200'
+    MULTICAST_LOOPBACK = False
+    MULTICAST_TTL = 1
+
+    # have one machine aggregate the votes and send out the decision (see
+    # `Machine.aggregate`), rather than everyone sending them to everyone;
+    # another takes over once it hasn't decided in `AGGREGATION_TIMEOUT`.
+    AGGREGATION_ENABLED = False
+
+    # gossip the heartbeats to only the `peers.gossip_neighbors` (see
+    # `Machine.gossip`), rather than to everyone; so each machine keeps
+    # O(log N) connections, and they reach everyone within
+    # ceil(log_GOSSIP_BASE(N)) rounds (a bigger base is fewer rounds, but
+    # more connections).
+    GOSSIP_ENABLED = False
+    GOSSIP_BASE = 2
+    # a gossiped message isn't superseded by the next one, so it's only
+    # dropped if this many are still waiting to be sent (see `PeerSender`).
+    GOSSIP_QUEUE_LEN = 16
+
+    # send each event out as soon as it happens, and apply them as they come
+    # in (see `Machine.reactive`), rather than voting on them each heartbeat;
+    # every `REACTIVE_INTERVAL`, everyone sends out the events they're at, in
+    # case any were missed.
+    REACTIVE_ENABLED = False
+    REACTIVE_INTERVAL = 1.0
+
+    # decide every channel together (see `ChannelState.batch_choice_func`),
+    # rather than one at a time; only worth it for lots of channels, and
+    # with `numpy` installed.
+    BATCH_CONSENSUS = False
+
+    # shorten the `metronome`'s rounds (down to `HANDSHAKE_INTERVAL_MIN`)
+    # while there are events, and back off (by `ADAPTIVE_BACKOFF` a round, up
+    # to `HANDSHAKE_INTERVAL_MAX`) while there aren't; and wait for votes for
+    # `RTT_TIMEOUT_FACTOR` times the `RTT_PERCENTILE` of the measured round
+    # trip times, rather than `HEARTBEAT_TIMEOUT` (see `RoundScheduler`).
+    ADAPTIVE_ENABLED = False
+    ADAPTIVE_BACKOFF = 1.5
+    HANDSHAKE_INTERVAL_MIN = 0.05
+    HANDSHAKE_INTERVAL_MAX = 1.0
+    HEARTBEAT_TIMEOUT_MIN = 0.005
+    RTT_PERCENTILE = 0.99
+    RTT_TIMEOUT_FACTOR = 3.0
+
     HANDSHAKE_ENABLED = True
     HANDSHAKE_TIMEOUT = 0.05
     HANDSHAKE_INTERVAL = 0.25
     HEARTBEAT_TIMEOUT = 0.2
+    AGGREGATION_TIMEOUT = 0.6
     TIMEOUT = 1
+    # a machine is suspected to be down (and not waited on) once its `phi`
+    # is above this, i.e. roughly ~9 `HANDSHAKE_INTERVAL`s without a word.
+    PHI_THRESHOLD = 4.0
+    PHI_WINDOW = 100
+    # how many of the latest samples of each peer's clock offset to pick the
+    # best of (see `ClockSync`).
+    CLOCK_SYNC_WINDOW = 8
+    # and how many peers each heartbeat echoes, at most.
+    CLOCK_SYNC_ECHOES = 2
+    # every this many seconds, each machine prints its `Machine.stats`, e.g.
+    # how contended its locks are (or never, if 0).
+    STATS_INTERVAL = 0.0
+    RECONNECT_BACKOFF_MIN = 0.05
+    RECONNECT_BACKOFF_MAX = 2.0
     TOLERABLE_DELAY = 0.01
 
     PYGAME_DELAY = 0.001
+    # how many decoded chunks each `LocalMusicStreamer` keeps, and how many
+    # past the playhead it decodes ahead of time (see `ChunkCache`).
+    CHUNK_CACHE_SIZE = 8
+    CHUNK_PREFETCH = 2
+
+    # while playing, make up any drift of up to `DRIFT_MAX_DELAY` from the
+    # consensus by resampling the next chunks to play up to `DRIFT_MAX_RATE`
+    # faster (or slower), rather than stopping to seek (see
+    # `LocalMusicStreamer.correct_drift`); this needs `numpy`.
+    DRIFT_CORRECTION_ENABLED = False
+    DRIFT_MAX_DELAY = 0.25
+    DRIFT_MAX_RATE = 0.02
 
     REMOTE_DELAY_SHORT = 0.5
     REMOTE_DELAY_LONG = 5.0
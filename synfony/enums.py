@@ -4,6 +4,15 @@
 from enum import Enum
 
 
+# The states of a connection kept up by the `ReconnectManager`.
+class ConnectionState(Enum):
+    DISCONNECTED = 0
+    CONNECTING = 1
+    CONNECTED = 2
+    BACKING_OFF = 3
+    CLOSED = 4
+
+
 # The possible user events (and which are serialized in the wire)
 class EventCode(Enum):
     NONE = 0
@@ -17,3 +26,6 @@ class EventCode(Enum):
 class OperationCode(Enum):
     HEARTBEAT = 0
     IDENTITY = 1
+    DECISION = 2
+    GOSSIP = 3
+    EVENT = 4
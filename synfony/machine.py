@@ -3,12 +3,19 @@
 
 from synfony.config import Config
 from synfony.enums import EventCode, OperationCode
-from synfony.models import BaseRequest, HeartbeatRequest, IdentityRequest
-from synfony.models import ChannelState, MachineAddress, NoneEvent
-from synfony.sockets import TCPSockets
+from synfony.models import BaseRequest, DecisionRequest, EventRequest
+from synfony.models import GossipRequest, HeartbeatRequest, IdentityRequest
+from synfony.models import BaseEvent, ChannelState, MachineAddress, NoneEvent
+from synfony.peers import Backoff, ClockSync, ConnectionRegistry
+from synfony.peers import FailureDetector
+from synfony.peers import GossipView, LeaderElection, PeerSender, PeerTable
+from synfony.peers import ReactiveState, ReconnectManager, RoundScheduler
+from synfony.peers import VoteSlots
+from synfony.peers import gossip_neighbors
+from synfony.sockets import FramedTCPSockets, MulticastUDPSockets
 from synfony.ui import UI
 from threading import Thread
-from typing import Callable, List
+from typing import Callable, Dict, List, Optional, Tuple
 
 
 import threading
@@ -17,68 +24,73 @@ import time
 
 class Machine:
 
-    _lock = threading.Lock()
+    sockets = FramedTCPSockets
+    # if `Config.MULTICAST_ENABLED`, then the heartbeats are sent over this.
+    heartbeat_sockets = MulticastUDPSockets
 
-    sockets = TCPSockets
+    # the shared components of each machine running `networking` here (by
+    # its `idx`), so they can be looked at while it runs (see `stats`).
+    components: Dict[int, Dict[str, object]] = {}
 
     @classmethod
-    def startup(cls, idx, machine_addresses, machine_message_queues):
+    def startup(cls,
+                idx,
+                peer_table,
+                connections,
+                receive,
+                reconnects,
+                neighbors=None):
+        """Listen, and connect to the `neighbors` (or everyone else); each
+            request then received is passed to `receive` (see
+            `receive_request`).
+        """
+        machine_addresses = peer_table.get_machine_addresses()
         machine_address = machine_addresses[idx]
         s = cls.sockets.start_socket(
             machine_address=machine_address,
             timeout=None,
             bind=True
         )
+        connections.register(idx, s)
 
-        sockets = [None for _ in machine_addresses]
-
-        def connect_to_socket(idx, other_machine_address):
-            if other_machine_address.get_idx() == idx:
-                with cls._lock:
-                    sockets[idx] = s
-            else:
-                while True:
-                    try:
-                        other_socket = cls.sockets.start_socket(
-                            machine_address=other_machine_address,
-                            timeout=Config.HANDSHAKE_TIMEOUT,
-                            connect=True
-                        )
-                        cls.sockets.sendall(
-                            other_socket,
-                            IdentityRequest(
-                                machine_address=machine_address
-                            ).serialize()
-                        )
-                        with cls._lock:
-                            sockets[other_machine_address
-                                    .get_idx()] = other_socket
-                        break
-                    except Exception:
-                        pass
-        connect_threads = [
-            threading.Thread(
-                target=connect_to_socket,
-                args=[idx, other_machine_address]
+        def handshake(other_socket):
+            cls.sockets.sendall(
+                other_socket,
+                IdentityRequest(
+                    machine_address=machine_address
+                ).serialize()
             )
-            for other_machine_address in machine_addresses]
-        [thread.start() for thread in connect_threads]
+
+        other_machine_addresses = [
+            other_machine_address
+            for other_machine_address in machine_addresses
+            if other_machine_address.get_idx() != idx and
+            (neighbors is None or other_machine_address.get_idx() in neighbors)
+        ]
+
+        # `reconnects` keeps these up, and registers them in `connections`.
+        [reconnects.connect(other_machine_address.get_idx(),
+                            other_machine_address,
+                            handshake=handshake,
+                            timeout=Config.HANDSHAKE_TIMEOUT)
+         for other_machine_address in other_machine_addresses]
         threading.Thread(
             target=cls.accept_clients,
-            args=(idx, machine_addresses, s, machine_message_queues)
+            args=(idx, peer_table, s, receive)
         ).start()
-        [thread.join() for thread in connect_threads]
+        [reconnects.wait_connected(other_machine_address.get_idx())
+         for other_machine_address in other_machine_addresses]
 
         time.sleep(Config.TIMEOUT)
 
-        return sockets
+        return connections.get_sockets()
 
     @classmethod
     def accept_clients(cls,
                        idx,
-                       machine_addresses,
+                       peer_table,
                        s,
-                       machine_message_queues):
+                       receive):
         """Called when the initial handshake between two machines begins.
 
             The startup protocol is:
@@ -86,61 +98,196 @@ class Machine:
                 2 - send `IdentityRequest`s
                 3 - start `listen_client` threads
         """
+        backoff = Backoff()
         while True:
+            connection = None
             try:
                 # 1 - accept connection
                 connection, _ = cls.sockets.accept(s)
+                backoff.reset()
 
                 # 2 - `IdentityRequest`
                 request_data = cls.sockets.recv(connection)
                 if (BaseRequest.peek_operation_code(request_data) !=
                         OperationCode.IDENTITY):
+                    cls.sockets.close(connection)
                     continue
                 request = IdentityRequest.deserialize(request_data)
                 machine_address = request.get_machine_address()
-                with cls._lock:
-                    if machine_address.get_idx() >= len(machine_addresses):
-                        while (machine_address.get_idx() <
-                               len(machine_addresses)):
-                            machine_addresses.append(None)
-                    machine_addresses[machine_address.get_idx()] = \
-                        machine_address
+                peer_table.add(machine_address)
 
                 # 3 - `listen_client` start
                 threading.Thread(
                     target=cls.listen_client,
                     args=[machine_address.get_idx(),
                           connection,
-                          machine_message_queues]
+                          receive,
+                          peer_table]
                 ).start()
             except Exception:
-                pass
+                if connection is not None:
+                    cls.sockets.close(connection)
+                time.sleep(backoff.next_delay())
 
     @classmethod
-    def listen_client(cls, idx, connection, machine_message_queues):
+    def listen_client(cls, idx, connection, receive, peer_table):
         """For continued listening on a client, where the handshakes are
-            received.
+            received; until the connection is closed (or breaks), then that
+            guy is down, and this thread is done.
         """
-        while True:
-            try:
+        try:
+            while True:
                 request_data = cls.sockets.recv(connection)
-                if (BaseRequest.peek_operation_code(request_data) !=
-                        OperationCode.HEARTBEAT):
-                    continue
-                request = HeartbeatRequest.deserialize(request_data)
-                with cls._lock:
-                    machine_message_queues[idx].append(request)
-            except Exception:
-                pass
+                if len(request_data) == 0:
+                    break
+                receive(idx, request_data)
+        except Exception:
+            pass
+        finally:
+            cls.sockets.close(connection)
+            peer_table.set_status(idx, False)
+
+    @classmethod
+    def listen_multicast(cls, my_idx, s, receive, peer_table):
+        """Like `listen_client`, but for every machine's multicast heartbeats
+            (see `start_multicast`).
+        """
+        try:
+            while True:
+                idx, request_data = cls.heartbeat_sockets.recv_from(s)
+                if idx != my_idx and receive(idx, request_data):
+                    peer_table.set_status(idx, True)
+        except Exception:
+            pass
+        finally:
+            cls.heartbeat_sockets.close(s)
+
+    @classmethod
+    def receive_request(cls,
+                        idx,
+                        request_data,
+                        vote_slots,
+                        decision_slots,
+                        failure_detector,
+                        gossip_view=None,
+                        reactive_state=None,
+                        clock_sync=None,
+                        scheduler=None,
+                        peer_table=None) -> bool:
+        """Keep `request_data` as the vote of machine `idx` if it is a
+            `HeartbeatRequest`, as its decision if a `DecisionRequest`, each
+            of the (not yet heard of) votes it relays if a `GossipRequest`,
+            or each of its events if an `EventRequest`; their
+            `sent_timestamp`s are then by my clock (see `clock_synced`). A
+            vote with any events wakes up the `scheduler`, if given; and one
+            with a different membership version has its `MachineAddress`es
+            merged into the `peer_table`, if given, and I send mine next.
+
+            Returns: whether it was any of them.
+        """
+        received_t = ClockSync.now()
+        if idx >= len(vote_slots):
+            return False
+
+        def copy(heartbeat: HeartbeatRequest) -> HeartbeatRequest:
+            heartbeat = HeartbeatRequest.deserialize(heartbeat.serialize())
+            if clock_sync is not None:
+                heartbeat.set_sent_timestamp(clock_sync.to_local(
+                    origin, heartbeat.get_sent_timestamp()))
+            return heartbeat
+
+        try:
+            match BaseRequest.peek_operation_code(request_data):
+                case OperationCode.HEARTBEAT:
+                    # lazily, since `metronome` only reads the latest one.
+                    request = HeartbeatRequest.deserialize_lazy(request_data)
+                    cls.clock_synced(idx, request, clock_sync, received_t)
+                    if (scheduler is not None and
+                            len(request.get_channel_events_states()) > 0):
+                        scheduler.wake()
+                    if (peer_table is not None and
+                            request.get_membership_version() !=
+                            peer_table.get_version()):
+                        peer_table.merge(request.get_machine_addresses())
+                        peer_table.request_snapshot()
+                    slots = vote_slots
+                case OperationCode.DECISION:
+                    request = DecisionRequest.deserialize(request_data)
+                    cls.clock_synced(idx, request, clock_sync, received_t)
+                    slots = decision_slots
+                case OperationCode.GOSSIP if gossip_view is not None:
+                    request = GossipRequest.deserialize(request_data)
+                    for origin, heartbeat in zip(request.get_origins(),
+                                                 request.get_heartbeats()):
+                        if origin >= len(vote_slots):
+                            continue
+                        # only a neighbor's own is an exchange with me.
+                        if origin == idx and clock_sync is not None:
+                            clock_sync.received(
+                                idx,
+                                heartbeat.get_sent_timestamp(),
+                                heartbeat.get_echo_idxes(),
+                                heartbeat.get_echo_sent_timestamps(),
+                                heartbeat.get_echo_received_timestamps(),
+                                received_t
+                            )
+                        # voting with a copy, since `decide` shifts the
+                        # timestamps, but it's passed on as it was sent.
+                        if gossip_view.merge(origin, heartbeat, copy):
+                            vote_slots.put(origin, heartbeat)
+                            failure_detector.heartbeat(origin)
+                    return True
+                case OperationCode.EVENT if reactive_state is not None:
+                    request = EventRequest.deserialize(request_data)
+                    [reactive_state.merge(clock, origin, event, sent_timestamp)
+                     for event, clock, origin, sent_timestamp
+                     in zip(request.get_events(),
+                            request.get_clocks(),
+                            request.get_origins(),
+                            request.get_sent_timestamps())]
+                    failure_detector.heartbeat(idx)
+                    return True
+                case _:
+                    return False
+        except Exception:
+            return False
+        slots.put(idx, request)
+        failure_detector.heartbeat(idx)
+        return True
+
+    @classmethod
+    def clock_synced(cls,
+                     idx: int,
+                     request,
+                     clock_sync: Optional[ClockSync],
+                     t: float):
+        """Take the NTP-style sample of `request` (a `HeartbeatRequest` or
+            `DecisionRequest` from machine `idx`, got at `t`), then make its
+            `sent_timestamp` by my clock, rather than theirs.
+        """
+        if clock_sync is None:
+            return
+        clock_sync.received(idx,
+                            request.get_sent_timestamp(),
+                            request.get_echo_idxes(),
+                            request.get_echo_sent_timestamps(),
+                            request.get_echo_received_timestamps(),
+                            t)
+        request.set_sent_timestamp(
+            clock_sync.to_local(idx, request.get_sent_timestamp()))
 
     @classmethod
     def metronome(cls,
                   my_idx: int,
-                  sockets,
-                  machine_addresses: List[MachineAddress],
+                  senders: List[Optional[PeerSender]],
+                  peer_table: PeerTable,
                   ui_manager: UI,
-                  machine_message_queues: List[HeartbeatRequest],
-                  choice_func: Callable = ChannelState.choice_func):
+                  vote_slots: VoteSlots,
+                  failure_detector: FailureDetector,
+                  choice_func: Callable = ChannelState.choice_func,
+                  multicast=None,
+                  clock_sync: Optional[ClockSync] = None,
+                  scheduler: Optional[RoundScheduler] = None):
         """Share and reach consensus about `state`, so we can pass it to the
             `LocalMusicStreamer`.
 
@@ -152,23 +299,119 @@ class Machine:
                 3 - do consensus, update state, call `LocalMusicStreamer.sync`.
                 4 - do the next handshake-heartbeat.
 
-            (2) can take up to `Config.HEARTBEAT_TIMEOUT` amount of time; so
+            (2) can take up to `Config.HEARTBEAT_TIMEOUT` amount of time (if
+            some guy is down, but not yet suspected by `failure_detector`); so
             then (3, 4) will take up the remainder of time of
                 `Config.HANDSHAKE_INTERVAL`, which is a lil longer.
 
-            Also, we are actually doing a bunch of retries in (1) / (2), which
-            are timing out in `Config.HANDSHAKE_TIMEOUT`, whcih are much faster
-            than `Config.HEARTBEAT_TIMEOUT`.
+            The sends in (1) are only queued on the `senders` (or it's just
+            the one send on `multicast`, if given), so a slow guy never holds
+            up the round; and (2) ends as soon as the last vote comes in,
+            since `listen_client` wakes up `vote_slots`.
+
+            If a `scheduler` is given, then it sets the timeout of (2) and the
+            length of the round (rather than `Config.HEARTBEAT_TIMEOUT` and
+            `Config.HANDSHAKE_INTERVAL`), and any events wake up (4).
         """
         start_t = time.time()
+        if scheduler is None:
+            heartbeat_timeout = Config.HEARTBEAT_TIMEOUT
+        else:
+            heartbeat_timeout = scheduler.heartbeat_timeout(
+                clock_sync.rtts() if clock_sync is not None else [])
 
-        latest_events = \
-            [[event for event in ui_manager.event_queue[::-1]
-              if event.get_channel_state().get_idx() == c_idx]
-             for c_idx in range(len(ui_manager.streamers))]
+        request = cls.make_heartbeat(peer_table.get_machine_addresses(),
+                                     ui_manager,
+                                     clock_sync,
+                                     peer_table.take_snapshot_due())
+        vote_slots.put(my_idx, request)
+
+        request_data = request.serialize()
+
+        # 1 - send to all, each `PeerSender` updates that guy's status; or
+        # multicast it, then that's done by `listen_multicast`.
+        cls.send_to(request_data, range(len(senders)), senders, multicast)
+
+        # 2 - wait until every vote is in (`listen_client` wakes us up) or it
+        # times out; but not for anyone suspected to be down, whose vote is
+        # still counted if it comes in anyways.
+        trusted = failure_detector.get_trusted(my_idx)
+        vote_slots.wait_full(
+            max(heartbeat_timeout - (time.time() - start_t), 0),
+            trusted
+        )
+
+        # votes doesn't care about `machine_id`; with a `scheduler`, the
+        # rounds don't all line up, so a missing vote is only late.
+        votes: List[HeartbeatRequest] = []
+        for i, slot in enumerate(vote_slots.take()):
+            if i != my_idx:
+                peer_table.set_status(
+                    i,
+                    slot is not None or (scheduler is not None and
+                                         i in trusted),
+                    only_if_up=True
+                )
 
+            if slot is not None:
+                votes.append(slot[0])
+
+        # 3 - consensus + `ui_manager.streamer.sync(...)`
+        cls.consensus(votes, ui_manager, choice_func)
+
+        # 4 - wait for next
+        if scheduler is None:
+            time.sleep(
+                max(Config.HANDSHAKE_INTERVAL - (time.time() - start_t), 0.01)
+            )
+        else:
+            scheduler.observe(any(len(vote.get_channel_events_states()) > 0
+                                  for vote in votes))
+            scheduler.sleep(
+                max(scheduler.interval - (time.time() - start_t), 0.01)
+            )
+
+    @classmethod
+    def make_heartbeat(cls,
+                       machine_addresses: List[MachineAddress],
+                       ui_manager: UI,
+                       clock_sync: Optional[ClockSync] = None,
+                       full: bool = True,
+                       echo_to: Optional[List[int]] = None
+                       ) -> HeartbeatRequest:
+        """Make my `HeartbeatRequest` (i.e. my vote) from the latest event
+            of each channel in `ui_manager.event_queue`, and the state of the
+            streamers; with the echoes of `clock_sync` (to `echo_to`, or
+            anyone), if given, and only the version of the
+            `machine_addresses` unless `full`.
+        """
         # TODO: lock in UI
+        events = list(ui_manager.event_queue)
         ui_manager.event_queue.clear()
+
+        echo_idxes, echo_sent_timestamps, echo_received_timestamps = \
+            clock_sync.get_echoes(echo_to) if clock_sync is not None else \
+            ([], [], [])
+        return HeartbeatRequest(
+            channel_events_states=cls.make_events(events, ui_manager),
+            machine_addresses=machine_addresses if full else [],
+            sent_timestamp=ClockSync.now(),
+            membership_version=PeerTable.version_of(machine_addresses),
+            echo_idxes=echo_idxes,
+            echo_sent_timestamps=echo_sent_timestamps,
+            echo_received_timestamps=echo_received_timestamps
+        )
+
+    @classmethod
+    def make_events(cls, events: List[BaseEvent], ui_manager: UI
+                    ) -> List[BaseEvent]:
+        """The latest of the `events` of each channel, with the state of its
+            streamer.
+        """
+        latest_events = \
+            [[event for event in events[::-1]
+              if event.get_channel_state().get_idx() == c_idx]
+             for c_idx in range(len(ui_manager.streamers))]
         channel_events_states = \
             [latest_events[c_idx][0]
              # NoneEvent(channel_state=ChannelState(idx=c_idx))
@@ -204,99 +447,479 @@ class Machine:
             )
          ) for event in channel_events_states]
 
-        request = HeartbeatRequest(
-            channel_events_states=channel_events_states,
-            machine_addresses=machine_addresses,
-            sent_timestamp=time.time()
-        )
-        with cls._lock:
-            machine_message_queues[my_idx].append(request)
+        return channel_events_states
 
-        request_data = request.serialize()
+    @classmethod
+    def consensus(cls,
+                  votes: List[HeartbeatRequest],
+                  ui_manager: UI,
+                  choice_func: Callable = ChannelState.choice_func):
+        """Reach consensus on the `votes`, then update state, i.e. call
+            `LocalMusicStreamer.sync` on each channel with a vote.
+        """
+        cls.apply(cls.decide(votes, choice_func), ui_manager)
 
-        # 1 - send to all
-        def impl_send_state(s, i: int, request_data: bytes):
-            status = False
-            while time.time() - start_t < Config.HEARTBEAT_TIMEOUT:
-                try:
-                    cls.sockets.sendall(s, request_data)
-                    status = True
-                    break
-                except Exception:
-                    pass
-            with cls._lock:
-                machine_addresses[i].set_status(status)
-
-        send_threads = [threading.Thread(target=impl_send_state,
-                                         args=[sockets[machine.get_idx()],
-                                               machine.get_idx(),
-                                               request_data])
-                        for machine in machine_addresses
-                        if machine is not None and machine.get_idx() != my_idx]
-        [thread.start() for thread in send_threads]
-
-        # 2 - pull off queue, wait until acceptable
-        def any_message_queues_empty():
-            return len(
-                [queue for queue in machine_message_queues
-                 if len(queue) == 0]
-            ) > 0
-
-        while (time.time() - start_t < Config.HEARTBEAT_TIMEOUT and
-               any_message_queues_empty()):
-            time.sleep(Config.HANDSHAKE_TIMEOUT)
-
-        [thread.join() for thread in send_threads]
-
-        # votes doesn't care about `machine_id`
-        votes: List[HeartbeatRequest] = []
-        for i, queue in enumerate(machine_message_queues):
-            with cls._lock:
-                if machine_addresses[i].get_status() and i != my_idx:
-                    machine_addresses[i].set_status(len(queue) != 0)
-
-            if len(queue) != 0:
-                votes.append(queue[-1])
-
-            with cls._lock:
-                machine_message_queues[i].clear()
-
-        # 3 - consensus + `ui_manager.streamer.sync(...)`; and
-        #     increment the `._event._timestamp` by
-        #     `time.time() - ._sent_timestamp` to account for network latency
-        #     (relativistic effects are acceptable and within our
-        #     `Config.TOLERABLE_DELAY`)... do this here, since it's the
-        #      most accurate we can reasonably get it without going to
-        #      consensus (and is likely to be within tolerable range anyways).
-        [event.get_channel_state().set_timestamp(
-             event.get_channel_state().get_timestamp() +
-             max(time.time() - vote.get_sent_timestamp(), 0)
-         )
-         for vote in votes
-         for event in vote.get_channel_events_states()]
-
-        all_channel_idxes = {event.get_channel_state().get_idx()
-                             for vote in votes
-                             for event in vote.get_channel_events_states()}
-        all_channel_idx_events = [
-            [event
-             for vote in votes
-             for event in vote.get_channel_events_states()
-             if event.get_channel_state().get_idx() == c_idx]
-            for c_idx in all_channel_idxes
-        ]
-        [ui_manager.streamers[events[0].get_channel_state().get_idx()].sync(
-            choice_func(events)
-         )
-         for events in all_channel_idx_events
-         if len(events) > 0]
+    @classmethod
+    def decide(cls,
+               votes: List[HeartbeatRequest],
+               choice_func: Callable = ChannelState.choice_func,
+               latency: bool = True) -> List[ChannelState]:
+        """Reach consensus on the `votes`, i.e. the `ChannelState` of each
+            channel with a vote, in order of `idx`; with
+            `ChannelState.batch_choice_func` if `Config.BATCH_CONSENSUS` (and
+            `choice_func` is the default one). Unless `latency`, the
+            timestamps aren't moved along by the time since each vote was
+            sent.
+        """
+        # increment the `._event._timestamp` by
+        # `ClockSync.now() - ._sent_timestamp` to account for network latency
+        # (relativistic effects are acceptable and within our
+        # `Config.TOLERABLE_DELAY`)... do this here, since it's the
+        # most accurate we can reasonably get it without going to
+        # consensus (and is likely to be within tolerable range anyways).
+        # and, in the same pass, bucket the events by channel.
+        events = []
+        channels_events = {}
+        for vote in votes:
+            delay = max(ClockSync.now() - vote.get_sent_timestamp(), 0)
+            for event in vote.get_channel_events_states():
+                channel_state = event.get_channel_state()
+                if latency:
+                    channel_state.set_timestamp(
+                        channel_state.get_timestamp() + delay)
+                events.append(event)
+                channels_events.setdefault(channel_state.get_idx(),
+                                           []).append(event)
+
+        if (Config.BATCH_CONSENSUS and
+                choice_func is ChannelState.choice_func):
+            return ChannelState.batch_choice_func(events)
+        return [choice_func(channels_events[c_idx])
+                for c_idx in sorted(channels_events)]
+
+    @classmethod
+    def apply(cls, channel_states: List[ChannelState], ui_manager: UI):
+        """Update state, i.e. call `LocalMusicStreamer.sync` on each of the
+            `channel_states`' channel, unless it's already there.
+        """
+        [ui_manager.streamers[channel_state.get_idx()].sync(channel_state)
+         for channel_state in channel_states
+         if not ui_manager.streamers[channel_state.get_idx()].is_synced(
+             channel_state)]
         ui_manager.stop_loading()
 
+    @classmethod
+    def aggregate(cls,
+                  my_idx: int,
+                  senders: List[Optional[PeerSender]],
+                  peer_table: PeerTable,
+                  ui_manager: UI,
+                  vote_slots: VoteSlots,
+                  decision_slots: VoteSlots,
+                  failure_detector: FailureDetector,
+                  election: LeaderElection,
+                  choice_func: Callable = ChannelState.choice_func,
+                  multicast=None,
+                  clock_sync: Optional[ClockSync] = None):
+        """Like `metronome`, but only the leader (see `LeaderElection`) gets
+            the votes and reaches consensus, then sends everyone the
+            `DecisionRequest`; so a round is O(N) messages, rather than
+            O(N^2).
+
+            The protocol is, for the leader:
+                1 - get everyone's state (as in `metronome`).
+                2 - do consensus, send out the decision, and update state.
+            and for everyone else:
+                1 - send my state to the leader.
+                2 - wait for the leader's decision, and update state; but if
+                    it hasn't decided in `Config.AGGREGATION_TIMEOUT`, then
+                    depose it, and the next one takes over.
+            then both wait for the next round.
+        """
+        start_t = time.time()
+
+        leader = election.get_leader(my_idx)
+        # the leader's isn't sent (its decision has the echoes).
+        request = cls.make_heartbeat(peer_table.get_machine_addresses(),
+                                     ui_manager,
+                                     clock_sync,
+                                     peer_table.take_snapshot_due(),
+                                     [] if leader == my_idx else [leader])
+
+        if leader == my_idx:
+            vote_slots.put(my_idx, request)
+            vote_slots.wait_full(
+                max(Config.HEARTBEAT_TIMEOUT - (time.time() - start_t), 0),
+                failure_detector.get_trusted(my_idx)
+            )
+            votes: List[HeartbeatRequest] = []
+            for i, slot in enumerate(vote_slots.take()):
+                if i != my_idx:
+                    peer_table.set_status(i, slot is not None,
+                                          only_if_up=True)
+                if slot is not None:
+                    votes.append(slot[0])
+
+            trusted = failure_detector.get_trusted(my_idx)
+            channel_states = cls.decide(votes, choice_func)
+            decision = DecisionRequest(
+                channel_states=channel_states,
+                machine_addresses=[
+                    MachineAddress(host=machine_address.get_host(),
+                                   idx=machine_address.get_idx(),
+                                   port=machine_address.get_port(),
+                                   status=machine_address.get_idx() in trusted)
+                    for machine_address in peer_table.get_machine_addresses()
+                    if machine_address is not None
+                ],
+                sent_timestamp=ClockSync.now()
+            )
+            if clock_sync is not None:
+                echo_idxes, echo_sent_timestamps, echo_received_timestamps = \
+                    clock_sync.get_echoes()
+                decision.set_echo_idxes(echo_idxes)
+                decision.set_echo_sent_timestamps(echo_sent_timestamps)
+                decision.set_echo_received_timestamps(
+                    echo_received_timestamps)
+            cls.send_to(decision.serialize(),
+                        range(len(senders)),
+                        senders,
+                        multicast)
+            cls.apply(channel_states, ui_manager)
+        else:
+            cls.send_to(request.serialize(), [leader], senders, multicast)
+            decision_slots.wait_full(
+                max(Config.HANDSHAKE_INTERVAL - (time.time() - start_t), 0),
+                [leader]
+            )
+            # votes sent to me by whoever thinks I'm the leader.
+            vote_slots.take()
+
+        # whoever decided (the lowest one, if there was a split) leads next.
+        decisions = [(i, slot[0])
+                     for i, slot in enumerate(decision_slots.take())
+                     if slot is not None and i != my_idx]
+        for i, decision in decisions[::-1]:
+            election.decided(
+                i,
+                [machine_address.get_idx()
+                 for machine_address in decision.get_machine_addresses()
+                 if machine_address.get_status()]
+            )
+        if leader != my_idx and len(decisions) > 0:
+            decision = decisions[0][1]
+            # and account for the network latency from the leader.
+            latency = max(ClockSync.now() - decision.get_sent_timestamp(), 0)
+            [channel_state.set_timestamp(channel_state.get_timestamp() +
+                                         latency)
+             for channel_state in decision.get_channel_states()
+             if channel_state.get_playing()]
+            cls.apply(decision.get_channel_states(), ui_manager)
+        election.check_leader()
+
+        time.sleep(
+            max(Config.HANDSHAKE_INTERVAL - (time.time() - start_t), 0.01)
+        )
+
+    @classmethod
+    def gossip(cls,
+               my_idx: int,
+               neighbors: List[int],
+               senders: List[Optional[PeerSender]],
+               peer_table: PeerTable,
+               ui_manager: UI,
+               vote_slots: VoteSlots,
+               failure_detector: FailureDetector,
+               gossip_view: GossipView,
+               choice_func: Callable = ChannelState.choice_func,
+               multicast=None,
+               clock_sync: Optional[ClockSync] = None):
+        """Like `metronome`, but only to my `neighbors` (see
+            `gossip_neighbors`), passing on each heartbeat I've heard since
+            the last round; so a heartbeat reaches everyone within
+            `ceil(log_base(N))` rounds.
+
+            The protocol is:
+                1 - send out my state, and the new ones I've heard.
+                2 - get my neighbors' (and whatever they pass on).
+                3 - do consensus on all of the new ones, update state.
+                4 - do the next handshake-heartbeat.
+        """
+        start_t = time.time()
+
+        request = cls.make_heartbeat(peer_table.get_machine_addresses(),
+                                     ui_manager,
+                                     clock_sync,
+                                     full=False)
+        gossip_view.merge(my_idx, request)
+        vote_slots.put(my_idx, request)
+
+        # 1 - send to my neighbors.
+        relay = gossip_view.take_relay()
+        cls.send_to(
+            GossipRequest(origins=[origin for origin, _ in relay],
+                          heartbeats=[heartbeat for _, heartbeat in relay]
+                          ).serialize(),
+            neighbors,
+            senders,
+            multicast
+        )
+
+        # 2 - wait until each of my (trusted) neighbors' is in.
+        trusted = set(failure_detector.get_trusted(my_idx))
+        vote_slots.wait_full(
+            max(Config.HEARTBEAT_TIMEOUT - (time.time() - start_t), 0),
+            [i for i in neighbors if i in trusted] + [my_idx]
+        )
+
+        # the others' only come in (if ever) a few rounds later, so they're
+        # up so long as they aren't suspected.
+        for i, slot in enumerate(vote_slots.take()):
+            if i in neighbors:
+                peer_table.set_status(i, slot is not None, only_if_up=True)
+            elif i != my_idx:
+                peer_table.set_status(i, i in trusted)
+
+        # 3 - consensus + `ui_manager.streamer.sync(...)`
+        cls.consensus(gossip_view.take_votes(), ui_manager, choice_func)
+
         # 4 - wait for next
         time.sleep(
             max(Config.HANDSHAKE_INTERVAL - (time.time() - start_t), 0.01)
         )
 
+    @classmethod
+    def reactive(cls,
+                 my_idx: int,
+                 senders: List[Optional[PeerSender]],
+                 ui_manager: UI,
+                 reactive_state: ReactiveState,
+                 choice_func: Callable = ChannelState.choice_func,
+                 multicast=None):
+        """Rather than voting on the events every heartbeat, send my events
+            out as soon as they happen, and apply everyone's as they come in
+            (see `ReactiveState`); so an event takes effect everywhere about
+            one network trip after it happens.
+
+            The protocol is:
+                1 - wait for my events, or anyone else's (`ui_manager` or
+                    `receive_request` wake us up).
+                2 - stamp mine with the next clock, and send them out.
+                3 - every `Config.REACTIVE_INTERVAL`, send out all of the
+                    events I'm at, in case anyone missed any.
+                4 - do consensus on the events each changed channel is at,
+                    update state.
+        """
+        # 1 - wait for any events
+        reactive_state.wait(max(
+            Config.REACTIVE_INTERVAL -
+            (time.monotonic() - reactive_state.snapshot_t),
+            0
+        ))
+
+        # 2 - send out mine
+        events = list(ui_manager.event_queue)
+        ui_manager.event_queue.clear()
+        events = cls.make_events(events, ui_manager)
+        if len(events) > 0:
+            clock = reactive_state.tick()
+            sent_timestamp = ClockSync.now()
+            [reactive_state.merge(clock, my_idx, event, sent_timestamp)
+             for event in events]
+            cls.send_to(EventRequest(events=events,
+                                     clocks=[clock for _ in events],
+                                     origins=[my_idx for _ in events],
+                                     sent_timestamps=[sent_timestamp
+                                                      for _ in events]
+                                     ).serialize(),
+                        range(len(senders)),
+                        senders,
+                        multicast)
+
+        # 3 - send out everything
+        if (time.monotonic() - reactive_state.snapshot_t >=
+                Config.REACTIVE_INTERVAL):
+            snapshot = reactive_state.snapshot()
+            if len(snapshot) > 0:
+                cls.send_to(
+                    EventRequest(
+                        events=[event for _, _, event, _ in snapshot],
+                        clocks=[clock for clock, _, _, _ in snapshot],
+                        origins=[origin for _, origin, _, _ in snapshot],
+                        sent_timestamps=[sent_timestamp
+                                         for _, _, _, sent_timestamp
+                                         in snapshot]
+                    ).serialize(),
+                    range(len(senders)),
+                    senders,
+                    multicast
+                )
+
+        # 4 - consensus + `ui_manager.streamer.sync(...)`
+        changed = reactive_state.take_changed()
+        if len(changed) > 0:
+            cls.apply(
+                cls.decide_events(
+                    [(event, sent_timestamp)
+                     for channel in changed
+                     for _, event, sent_timestamp
+                     in reactive_state.get_events(channel)],
+                    choice_func
+                ),
+                ui_manager
+            )
+
+    @classmethod
+    def decide_events(cls,
+                      events: List[Tuple[BaseEvent, float]],
+                      choice_func: Callable = ChannelState.choice_func
+                      ) -> List[ChannelState]:
+        """Reach consensus on the `events` (each with its `sent_timestamp`),
+            each as its own vote, for `reactive`.
+
+            Unlike `decide`, the timestamps are only moved along by the time
+            since they were sent once decided, and only if playing (as in
+            `aggregate`); since an event may be resent long after it
+            happened, and a pause is made while still playing.
+        """
+        channel_states = cls.decide([HeartbeatRequest(
+                                         channel_events_states=[event],
+                                         machine_addresses=[],
+                                         sent_timestamp=sent_timestamp
+                                     )
+                                     for event, sent_timestamp in events],
+                                    choice_func,
+                                    latency=False)
+        now = ClockSync.now()
+        for channel_state in channel_states:
+            if not channel_state.get_playing():
+                continue
+            # when the event it's at was sent.
+            sent_timestamps = [
+                sent_timestamp
+                for event, sent_timestamp in events
+                if (event.get_channel_state().get_idx() ==
+                    channel_state.get_idx() and
+                    event.get_channel_state().get_timestamp() ==
+                    channel_state.get_timestamp())
+            ]
+            if len(sent_timestamps) > 0:
+                channel_state.set_timestamp(
+                    channel_state.get_timestamp() +
+                    max(now - max(sent_timestamps), 0))
+        return channel_states
+
+    @classmethod
+    def send_to(cls,
+                request_data: bytes,
+                idxes,
+                senders: List[Optional[PeerSender]],
+                multicast=None):
+        """Send `request_data` to each of the `idxes` (or to everyone, once,
+            on `multicast` if given).
+        """
+        if multicast is not None:
+            try:
+                cls.heartbeat_sockets.sendall(multicast, request_data)
+            except Exception:
+                # so this one's lost, the next one replaces it anyways.
+                pass
+        else:
+            [senders[i].send(request_data)
+             for i in idxes
+             if i < len(senders) and senders[i] is not None]
+
+    @classmethod
+    def start_multicast(cls,
+                        idx: int,
+                        peer_table: PeerTable,
+                        receive: Callable):
+        """Join `Config.MULTICAST_GROUP`, listening on it with
+            `listen_multicast`.
+
+            Returns: the socket to multicast my heartbeats on.
+        """
+        host, port = tuple(Config.MULTICAST_GROUP.split(':'))
+        group = MachineAddress(host=host, idx=idx, port=int(port))
+        s = cls.heartbeat_sockets.start_socket(machine_address=group,
+                                               bind=True)
+        threading.Thread(
+            target=cls.listen_multicast,
+            args=[idx, s, receive, peer_table]
+        ).start()
+        return cls.heartbeat_sockets.start_socket(machine_address=group,
+                                                  connect=True)
+
+    @classmethod
+    def make_senders(cls,
+                     my_idx: int,
+                     sockets,
+                     peer_table: PeerTable,
+                     reconnects: ReconnectManager,
+                     neighbors: Optional[List[int]] = None
+                     ) -> List[Optional[PeerSender]]:
+        """Start a `PeerSender` for each of the other machines' (or only my
+            `neighbors'`, to gossip to) sockets, which reports a failed socket
+            to `reconnects`.
+        """
+        return [PeerSender(cls.sockets,
+                           s,
+                           i,
+                           on_status=peer_table.set_status,
+                           max_len=(Config.OUTBOUND_QUEUE_LEN
+                                    if neighbors is None else
+                                    Config.GOSSIP_QUEUE_LEN),
+                           on_failure=reconnects.disconnected)
+                if i != my_idx and (neighbors is None or i in neighbors)
+                else None
+                for i, s in enumerate(sockets)]
+
+    @classmethod
+    def peer_stats(cls, idx: int) -> Dict[int, Dict[str, float]]:
+        """The `PeerSender.stats` of each of the other machines, i.e. the
+            send latencies and drops to each, of machine `idx`.
+        """
+        return {i: sender.stats()
+                for i, sender in enumerate(cls.components.get(idx, {})
+                                           .get('senders', []))
+                if sender is not None}
+
+    @classmethod
+    def lock_stats(cls, idx: int) -> Dict[str, Dict[str, float]]:
+        """The `TimedLock.stats` of each of machine `idx`'s shared
+            components, to see which (if any) are contended.
+        """
+        return {name: component.lock_stats()
+                for name, component in cls.components.get(idx, {}).items()
+                if hasattr(component, 'lock_stats')}
+
+    @classmethod
+    def stats(cls, idx: int) -> Dict[str, dict]:
+        """Everything there is to monitor of machine `idx` while it runs
+            `networking`, i.e. its `ClockSync.stats` (the estimates of each
+            of the other machines' clock offset and round trip time), its
+            `lock_stats` and its `peer_stats`.
+        """
+        clock_sync = cls.components.get(idx, {}).get('clock_sync', None)
+        return dict(
+            clocks=clock_sync.stats() if clock_sync is not None else {},
+            locks=cls.lock_stats(idx),
+            peers=cls.peer_stats(idx)
+        )
+
+    @classmethod
+    def report_stats(cls, idx: int, last_t: float) -> float:
+        """Print the `stats` of machine `idx`, if it's been
+            `Config.STATS_INTERVAL` since `last_t` (or never, if that's 0).
+
+            Returns: when they were last printed.
+        """
+        now = time.monotonic()
+        if Config.STATS_INTERVAL <= 0 or now - last_t < Config.STATS_INTERVAL:
+            return last_t
+        print(f'[{idx!s}] {cls.stats(idx)!r}')
+        return now
+
     @classmethod
     def handler(cls, e, s):
         """Handle any errors that come up.
@@ -310,6 +933,155 @@ class Machine:
         if e is not None:
             raise e
 
+    @classmethod
+    def networking(cls,
+                   idx: int,
+                   machine_addresses: List[MachineAddress],
+                   ui_manager: UI,
+                   choice_func: Callable = ChannelState.choice_func):
+        """Connect to the other machines (or only my `gossip_neighbors`),
+            then run the `metronome` (or `aggregate`, `reactive` or `gossip`)
+            forever.
+        """
+        peer_table = PeerTable(machine_addresses)
+        connections = ConnectionRegistry(len(machine_addresses))
+        vote_slots = VoteSlots(len(machine_addresses))
+        decision_slots = VoteSlots(len(machine_addresses))
+        failure_detector = FailureDetector(len(machine_addresses))
+        election = LeaderElection(len(machine_addresses))
+        clock_sync = ClockSync(len(machine_addresses), idx)
+        scheduler = None
+        if Config.ADAPTIVE_ENABLED:
+            scheduler = RoundScheduler()
+            ui_manager.event_queue.listeners.append(scheduler.wake)
+        # `aggregate` takes precedence, then `reactive`, then `gossip`.
+        gossip_view = None
+        neighbors = None
+        reactive_state = None
+        if Config.REACTIVE_ENABLED and not Config.AGGREGATION_ENABLED:
+            reactive_state = ReactiveState()
+            ui_manager.event_queue.listeners.append(reactive_state.notify)
+        elif Config.GOSSIP_ENABLED and not Config.AGGREGATION_ENABLED:
+            gossip_view = GossipView(len(machine_addresses))
+            neighbors = gossip_neighbors(idx, len(machine_addresses))
+        sockets = [None for _ in machine_addresses]
+        senders = []
+        multicast = None
+        cls.components[idx] = components = dict(
+            peer_table=peer_table,
+            connections=connections,
+            vote_slots=vote_slots,
+            decision_slots=decision_slots,
+            failure_detector=failure_detector,
+            clock_sync=clock_sync
+        )
+        if gossip_view is not None:
+            components['gossip_view'] = gossip_view
+        if reactive_state is not None:
+            components['reactive_state'] = reactive_state
+
+        def connected(i: int, s):
+            connections.register(i, s)
+            # so whoever (re)joined gets all of the `MachineAddress`es.
+            peer_table.request_snapshot()
+            if i < len(senders) and senders[i] is not None:
+                senders[i].set_socket(s)
+
+        def receive(i: int, request_data: bytes) -> bool:
+            return cls.receive_request(i,
+                                       request_data,
+                                       vote_slots,
+                                       decision_slots,
+                                       failure_detector,
+                                       gossip_view,
+                                       reactive_state,
+                                       clock_sync,
+                                       scheduler,
+                                       peer_table)
+
+        reconnects = ReconnectManager(cls.sockets, on_connect=connected)
+        try:
+            # before any are connected, so `connected` gives them each socket.
+            senders = cls.make_senders(idx,
+                                       connections.get_sockets(),
+                                       peer_table,
+                                       reconnects,
+                                       neighbors)
+            components['senders'] = senders
+            sockets = cls.startup(
+                idx=idx,
+                peer_table=peer_table,
+                connections=connections,
+                receive=receive,
+                reconnects=reconnects,
+                neighbors=neighbors
+            )
+            if Config.MULTICAST_ENABLED:
+                multicast = cls.start_multicast(idx, peer_table, receive)
+
+            stats_t = time.monotonic()
+            while True:
+                stats_t = cls.report_stats(idx, stats_t)
+                if Config.AGGREGATION_ENABLED:
+                    cls.aggregate(
+                        my_idx=idx,
+                        senders=senders,
+                        peer_table=peer_table,
+                        ui_manager=ui_manager,
+                        vote_slots=vote_slots,
+                        decision_slots=decision_slots,
+                        failure_detector=failure_detector,
+                        election=election,
+                        choice_func=choice_func,
+                        multicast=multicast,
+                        clock_sync=clock_sync
+                    )
+                elif reactive_state is not None:
+                    cls.reactive(
+                        my_idx=idx,
+                        senders=senders,
+                        ui_manager=ui_manager,
+                        reactive_state=reactive_state,
+                        choice_func=choice_func,
+                        multicast=multicast
+                    )
+                elif gossip_view is not None:
+                    cls.gossip(
+                        my_idx=idx,
+                        neighbors=neighbors,
+                        senders=senders,
+                        peer_table=peer_table,
+                        ui_manager=ui_manager,
+                        vote_slots=vote_slots,
+                        failure_detector=failure_detector,
+                        gossip_view=gossip_view,
+                        choice_func=choice_func,
+                        multicast=multicast,
+                        clock_sync=clock_sync
+                    )
+                else:
+                    cls.metronome(
+                        my_idx=idx,
+                        senders=senders,
+                        peer_table=peer_table,
+                        ui_manager=ui_manager,
+                        vote_slots=vote_slots,
+                        failure_detector=failure_detector,
+                        choice_func=choice_func,
+                        multicast=multicast,
+                        clock_sync=clock_sync,
+                        scheduler=scheduler
+                    )
+        except Exception as e:
+            cls.handler(e=e, s=sockets[idx])
+        finally:
+            cls.components.pop(idx, None)
+            [sender.stop() for sender in senders if sender is not None]
+            reconnects.stop()
+            if multicast is not None:
+                cls.heartbeat_sockets.close(multicast)
+            cls.handler(e=None, s=sockets[idx])
+
     @classmethod
     def main(cls, idx: int, machines: List[str]):
         """Start the connections and what not.
@@ -320,36 +1092,9 @@ class Machine:
                                  port=machine[1],
                                  status=(i == idx))
                              for i, machine in enumerate(machines)]
-        machine_message_queues = [[] for _ in machines]
-        sockets = []
         ui_manager = UI()
 
-        def networking(idx: int,
-                       machine_addresses: List[MachineAddress],
-                       sockets,
-                       ui_manager: UI):
-            try:
-                sockets = cls.startup(
-                    idx=idx,
-                    machine_addresses=machine_addresses,
-                    machine_message_queues=machine_message_queues
-                )
-
-                while True:
-                    cls.metronome(
-                        my_idx=idx,
-                        sockets=sockets,
-                        machine_addresses=machine_addresses,
-                        ui_manager=ui_manager,
-                        machine_message_queues=machine_message_queues,
-                        choice_func=ChannelState.choice_func
-                    )
-            except Exception as e:
-                cls.handler(e=e, s=sockets[idx])
-            finally:
-                cls.handler(e=None, s=sockets[idx])
-
         if Config.HANDSHAKE_ENABLED:
-            Thread(target=networking,
-                   args=[idx, machine_addresses, sockets, ui_manager]).start()
+            Thread(target=cls.networking,
+                   args=[idx, machine_addresses, ui_manager]).start()
         ui_manager.init(idx)
@@ -3,25 +3,61 @@
 
 from argparse import ArgumentParser, Namespace
 from multiprocessing import Process
+from synfony.async_machine import AsyncMachine
 from synfony.config import Config
 from synfony.machine import Machine
 
 
+# the `--engine` choices, i.e. which `Machine` runs the networking.
+ENGINES = {
+    'asyncio': AsyncMachine,
+    'threads': Machine,
+}
+
+
 def make_parser():
     """Makes a parser for command line arguments (i.e. machine addresses).
     """
     parser = ArgumentParser()
+    parser.add_argument('--adaptive',
+                        action='store_true',
+                        default=Config.ADAPTIVE_ENABLED,
+                        required=False)
+    parser.add_argument('--aggregate',
+                        action='store_true',
+                        default=Config.AGGREGATION_ENABLED,
+                        required=False)
+    parser.add_argument('--engine',
+                        choices=list(ENGINES.keys()),
+                        default=Config.ENGINE,
+                        required=False)
+    parser.add_argument('--gossip',
+                        action='store_true',
+                        default=Config.GOSSIP_ENABLED,
+                        required=False)
     parser.add_argument('--idx',
                         required=False,
                         type=int)
     parser.add_argument('--machines',
                         default=Config.MACHINES,
-                        required=False,
-                        type=list)
+                        nargs='+',
+                        required=False)
+    parser.add_argument('--multicast',
+                        action='store_true',
+                        default=Config.MULTICAST_ENABLED,
+                        required=False)
     parser.add_argument('--multiprocess',
                         action='store_true',
                         default=False,
                         required=False)
+    parser.add_argument('--reactive',
+                        action='store_true',
+                        default=Config.REACTIVE_ENABLED,
+                        required=False)
+    parser.add_argument('--stats',
+                        default=Config.STATS_INTERVAL,
+                        required=False,
+                        type=float)
     return parser
 
 
@@ -40,14 +76,21 @@ def parse_args():
 
 if __name__ == '__main__':
     args = parse_args()
+    machine = ENGINES[args.engine]
+    Config.ADAPTIVE_ENABLED = args.adaptive
+    Config.AGGREGATION_ENABLED = args.aggregate
+    Config.GOSSIP_ENABLED = args.gossip
+    Config.MULTICAST_ENABLED = args.multicast
+    Config.REACTIVE_ENABLED = args.reactive
+    Config.STATS_INTERVAL = args.stats
     if args.multiprocess:
-        for idx in range(3):
+        for idx in range(len(args.machines)):
             p = Process(
-                target=Machine.main,
+                target=machine.main,
                 args=(idx, args.machines)
             )
             p.start()
         while True:
             pass
     else:
-        Machine.main(args.idx, args.machines)
+        machine.main(args.idx, args.machines)
@@ -2,10 +2,16 @@
 # in synfony
 
 from synfony.enums import OperationCode, EventCode
-from synfony.serialization import SerializationUtils
+from synfony.serialization import SerializationUtils, int_fixed_width
 from synfony.util import Model
 from typing import Callable, Dict, List
 
+try:
+    import numpy
+except ImportError:
+    # it's optional, see `ChannelState.batch_choice_func`.
+    numpy = None
+
 
 # DATA MODELS
 
@@ -15,26 +21,31 @@ class MachineAddress(
         host=str,
         idx=int,
         port=int,
-        status=bool
+        status=bool,
+        slots=True
     )
 ):
-    pass
+    __slots__ = ()
 
 
 class BaseEvent(
-    Model.model_with_fields(event_code=int)
+    Model.model_with_fields(event_code=int, slots=True)
 ):
     """the basic data model of the `Event`s. Like operations, we will have to
         "peek" at the event code to see how to properly deserialize.
     """
 
+    __slots__ = ()
+
     @staticmethod
+    @int_fixed_width(1)
     def deserialize_event_code(data: bytes) -> int:
         """Deserialize `bytes` to the `int` value of an `EventCode`.
         """
         return SerializationUtils.deserialize_int(data[:1])
 
     @staticmethod
+    @int_fixed_width(1)
     def serialize_event_code(val: int) -> bytes:
         """Serialize the `int` value of an `EventCode` to `bytes`.
         """
@@ -48,21 +59,22 @@ class BaseEvent(
         return EventCode(BaseEvent.deserialize_event_code(data[:1]))
 
     @classmethod
-    def deserialize(cls, data: bytes):
-        """Deserialize a `BaseEvent` based on its `event_code`.
+    def peek_model(cls, data: bytes, offset: int = 0) -> type:
+        """The `BaseEvent` to deserialize at `offset`, based on its
+            `event_code`.
         """
-        event_code = BaseEvent.peek_event_code(data)
+        event_code = BaseEvent.peek_event_code(data[offset:offset + 1])
         match event_code:
             case EventCode.NONE:
-                return NoneEvent.deserialize(data)
+                return NoneEvent
             case EventCode.PAUSE:
-                return PauseEvent.deserialize(data)
+                return PauseEvent
             case EventCode.PLAY:
-                return PlayEvent.deserialize(data)
+                return PlayEvent
             case EventCode.SEEK:
-                return SeekEvent.deserialize(data)
+                return SeekEvent
             case EventCode.VOLUME:
-                return VolumeEvent.deserialize(data)
+                return VolumeEvent
             case _:
                 raise NotImplementedError()
 
@@ -98,7 +110,7 @@ class BaseEvent(
                                   list(new_fields.keys()))),
                 fields_list_nested=fields_list_nested,
                 **new_fields)):
-            pass
+            __slots__ = ()
 
         return __impl_class__
 
@@ -108,7 +120,8 @@ class ChannelState(Model.model_with_fields(
                            last_timestamp=float,
                            timestamp=float,
                            playing=bool,
-                           volume=float
+                           volume=float,
+                           slots=True
                        )
                    ):
     """this is the state which must reach consensus.
@@ -116,6 +129,8 @@ class ChannelState(Model.model_with_fields(
         deterministic choice function from a bunch of states.
     """
 
+    __slots__ = ()
+
     @staticmethod
     def choice_func(channel_events_states: List[BaseEvent]):
         """Reach consensus of what the global channel states are,
@@ -134,69 +149,154 @@ class ChannelState(Model.model_with_fields(
         if len(channel_events_states) == 0:
             return DEFAULT_CHANNEL_STATE
 
-        ordered_events = [event for event in channel_events_states]
-        ordered_events.sort(
-            key=lambda event: -1 * event.get_channel_state().get_timestamp()
-        )
-
-        any_pause = len(
-            [event for event in ordered_events
-             if event.get_event_code() == EventCode.PAUSE.value]
-        ) > 0
-
-        any_play = len(
-            [event for event in ordered_events
-             if event.get_event_code() == EventCode.PLAY.value]
-        ) > 0
-
-        any_playing = len(
-            [event for event in ordered_events
-             if event.get_channel_state().get_playing()]
-        ) > 0
-
-        seek_idxes = [i for i, event in enumerate(ordered_events)
-                      if event.get_event_code() == EventCode.SEEK.value]
-        any_seek = len(seek_idxes) > 0
-        if not any_seek and not any_playing:
-            seek_idxes = [0]
-        elif not any_seek:
-            seek_idxes = [i for i, event in enumerate(ordered_events)
-                          if event.get_channel_state().get_playing()]
-
-        vol_idxes = [i for i, event in enumerate(ordered_events)
-                     if event.get_event_code() == EventCode.VOLUME.value]
-        any_vol = len(vol_idxes) > 0
-        if not any_vol:
-            vol_idxes = [0]
+        # one pass, keeping the furthest along event (the first of any
+        # ties) overall, and of each kind the protocol cares about.
+        latest = latest_seek = latest_playing = latest_vol = None
+        any_pause = any_play = False
+        for event in channel_events_states:
+            channel_state = event.get_channel_state()
+            timestamp = channel_state.get_timestamp()
+            event_code = event.get_event_code()
+            if (latest is None or
+                    timestamp > latest.get_channel_state().get_timestamp()):
+                latest = event
+            if event_code == EventCode.SEEK.value:
+                if (latest_seek is None or
+                        timestamp >
+                        latest_seek.get_channel_state().get_timestamp()):
+                    latest_seek = event
+            elif event_code == EventCode.VOLUME.value:
+                if (latest_vol is None or
+                        timestamp >
+                        latest_vol.get_channel_state().get_timestamp()):
+                    latest_vol = event
+            elif event_code == EventCode.PAUSE.value:
+                any_pause = True
+            elif event_code == EventCode.PLAY.value:
+                any_play = True
+            if channel_state.get_playing():
+                if (latest_playing is None or
+                        timestamp >
+                        latest_playing.get_channel_state().get_timestamp()):
+                    latest_playing = event
+
+        any_seek = latest_seek is not None
+        any_playing = latest_playing is not None
+        seek_state = (latest_seek or latest_playing or latest)\
+            .get_channel_state()
+        vol_state = (latest_vol or latest).get_channel_state()
 
         return ChannelState(
-            idx=(
-                ordered_events[seek_idxes[0]].get_channel_state()
-                .get_idx()
-            ),
+            idx=seek_state.get_idx(),
             last_timestamp=(
-                ordered_events[seek_idxes[0]].get_channel_state()
-                .get_timestamp()
+                seek_state.get_timestamp()
                 if any_seek or any_playing or any_pause else
-                ordered_events[seek_idxes[0]].get_channel_state()
-                .get_last_timestamp()
+                seek_state.get_last_timestamp()
             ),
             timestamp=(
-                ordered_events[seek_idxes[0]].get_channel_state()
-                .get_timestamp()
+                seek_state.get_timestamp()
                 if any_seek or any_playing else
-                ordered_events[seek_idxes[0]].get_channel_state()
-                .get_last_timestamp()
+                seek_state.get_last_timestamp()
             ),
             playing=(
                 False if any_pause else (any_play or any_playing)
             ),
-            volume=(
-                ordered_events[vol_idxes[0]].get_channel_state()
-                .get_volume()
-            )
+            volume=vol_state.get_volume()
         )
 
+    @staticmethod
+    def batch_choice_func(channel_events_states: List[BaseEvent]
+                          ) -> List['ChannelState']:
+        """The `choice_func` of each channel with any of the
+            `channel_events_states` (of every channel), in order of `idx`;
+            with `numpy` (if it's installed), all of the channels are
+            decided together, from columns of their timestamps, flags and
+            volumes.
+        """
+        if numpy is None or len(channel_events_states) == 0:
+            channels_events = {}
+            for event in channel_events_states:
+                channels_events.setdefault(
+                    event.get_channel_state().get_idx(), []
+                ).append(event)
+            return [ChannelState.choice_func(channels_events[c_idx])
+                    for c_idx in sorted(channels_events)]
+
+        n = len(channel_events_states)
+        channel_states = [event.get_channel_state()
+                          for event in channel_events_states]
+        event_codes = numpy.fromiter((event.get_event_code()
+                                      for event in channel_events_states),
+                                     dtype=numpy.int64,
+                                     count=n)
+        idxes = numpy.fromiter((channel_state.get_idx()
+                                for channel_state in channel_states),
+                               dtype=numpy.int64,
+                               count=n)
+        timestamps = numpy.fromiter((channel_state.get_timestamp()
+                                     for channel_state in channel_states),
+                                    dtype=numpy.float64,
+                                    count=n)
+        last_timestamps = numpy.fromiter(
+            (channel_state.get_last_timestamp()
+             for channel_state in channel_states),
+            dtype=numpy.float64,
+            count=n
+        )
+        playings = numpy.fromiter((channel_state.get_playing()
+                                   for channel_state in channel_states),
+                                  dtype=bool,
+                                  count=n)
+        volumes = numpy.fromiter((channel_state.get_volume()
+                                  for channel_state in channel_states),
+                                 dtype=numpy.float64,
+                                 count=n)
+
+        # by channel, then furthest along, then first (like `choice_func`),
+        # so the first row of a channel (of a kind) is the one it picks.
+        order = numpy.lexsort((numpy.arange(n), -timestamps, idxes))
+        c_idxes, latest = numpy.unique(idxes[order], return_index=True)
+        latest = order[latest]
+
+        def first_of(mask):
+            rows = order[mask[order]]
+            any_of = numpy.zeros(len(c_idxes), dtype=bool)
+            first = latest.copy()
+            c_idxes_of, first_rows = numpy.unique(idxes[rows],
+                                                  return_index=True)
+            at = numpy.searchsorted(c_idxes, c_idxes_of)
+            any_of[at] = True
+            first[at] = rows[first_rows]
+            return any_of, first
+
+        any_seek, latest_seek = first_of(event_codes == EventCode.SEEK.value)
+        any_playing, latest_playing = first_of(playings)
+        any_vol, latest_vol = first_of(event_codes == EventCode.VOLUME.value)
+        any_pause, _ = first_of(event_codes == EventCode.PAUSE.value)
+        any_play, _ = first_of(event_codes == EventCode.PLAY.value)
+
+        moved = any_seek | any_playing
+        seek_rows = numpy.where(any_seek,
+                                latest_seek,
+                                numpy.where(any_playing,
+                                            latest_playing,
+                                            latest))
+        new_last_timestamps = numpy.where(moved | any_pause,
+                                          timestamps[seek_rows],
+                                          last_timestamps[seek_rows])
+        new_timestamps = numpy.where(moved,
+                                     timestamps[seek_rows],
+                                     last_timestamps[seek_rows])
+        new_playings = ~any_pause & (any_play | any_playing)
+        new_volumes = volumes[latest_vol]
+
+        return [ChannelState(idx=int(c_idxes[i]),
+                             last_timestamp=float(new_last_timestamps[i]),
+                             timestamp=float(new_timestamps[i]),
+                             playing=bool(new_playings[i]),
+                             volume=float(new_volumes[i]))
+                for i in range(len(c_idxes))]
+
 
 DEFAULT_CHANNEL_STATE = ChannelState(
     idx=0,
@@ -214,7 +314,7 @@ class MixedChannelState(
         muted=bool
     )
 ):
-    pass
+    __slots__ = ()
 
 
 class NoneEvent(
@@ -223,7 +323,7 @@ class NoneEvent(
         event_code=EventCode.NONE
     )
 ):
-    pass
+    __slots__ = ()
 
 
 class PauseEvent(
@@ -232,7 +332,7 @@ class PauseEvent(
         event_code=EventCode.PAUSE
     )
 ):
-    pass
+    __slots__ = ()
 
 
 class PlayEvent(
@@ -241,7 +341,7 @@ class PlayEvent(
         event_code=EventCode.PLAY
     )
 ):
-    pass
+    __slots__ = ()
 
 
 class SeekEvent(
@@ -250,7 +350,7 @@ class SeekEvent(
         event_code=EventCode.SEEK
     )
 ):
-    pass
+    __slots__ = ()
 
 
 class VolumeEvent(
@@ -259,7 +359,7 @@ class VolumeEvent(
         event_code=EventCode.VOLUME
     )
 ):
-    pass
+    __slots__ = ()
 
 
 # OBJECT MODELS
@@ -267,20 +367,24 @@ class VolumeEvent(
 
 # these are the basic ones.
 class BaseRequest(
-    Model.model_with_fields(operation_code=int)
+    Model.model_with_fields(operation_code=int, slots=True)
 ):
     """A `Model` which has an `operation_code` field, and the ability to peek
         at the `operation_code` fields (so we can figure out which
         deserializers to actually use).
     """
 
+    __slots__ = ()
+
     @staticmethod
+    @int_fixed_width(1)
     def deserialize_operation_code(data: bytes) -> int:
         """Deserialize `bytes` to the `int` value of an `OperationCode`.
         """
         return SerializationUtils.deserialize_int(data[:1])
 
     @staticmethod
+    @int_fixed_width(1)
     def serialize_operation_code(val: int) -> bytes:
         """Serialize the `int` value of an `OperationCode` to `bytes`.
         """
@@ -294,15 +398,23 @@ class BaseRequest(
         return OperationCode(BaseRequest.deserialize_operation_code(data[:1]))
 
     @classmethod
-    def deserialize(cls, data: bytes):
-        """Deserialize a `BaseRequest` based on its `operation_code`.
+    def peek_model(cls, data: bytes, offset: int = 0) -> type:
+        """The `BaseRequest` to deserialize at `offset`, based on its
+            `operation_code`.
         """
-        operation_code = OperationCode(BaseRequest.peek_operation_code(data))
+        operation_code = BaseRequest.peek_operation_code(
+            data[offset:offset + 1])
         match operation_code:
+            case OperationCode.DECISION:
+                return DecisionRequest
+            case OperationCode.EVENT:
+                return EventRequest
+            case OperationCode.GOSSIP:
+                return GossipRequest
             case OperationCode.HEARTBEAT:
-                return HeartbeatRequest.deserialize(data)
+                return HeartbeatRequest
             case OperationCode.IDENTITY:
-                return IdentityRequest.deserialize(data)
+                return IdentityRequest
             case _:
                 raise NotImplementedError()
 
@@ -339,24 +451,115 @@ class BaseRequest(
                                   list(new_fields.keys()))),
                 fields_list_nested=fields_list_nested,
                 **new_fields)):
-            pass
+            __slots__ = ()
 
         return __impl_class__
 
 
+# for `ClockSync`: when each machine sent the last message it heard from it,
+# and when that was got.
+ECHO_FIELDS = dict(
+    echo_idxes=list,
+    echo_sent_timestamps=list,
+    echo_received_timestamps=list
+)
+ECHO_FIELDS_LIST_NESTED = dict(
+    echo_idxes=int,
+    echo_sent_timestamps=float,
+    echo_received_timestamps=float
+)
+ECHO_FIELD_DEFAULTS = dict(
+    echo_idxes=[],
+    echo_sent_timestamps=[],
+    echo_received_timestamps=[]
+)
+
+
 class HeartbeatRequest(
     BaseRequest.add_fields_with_operation_code(
         channel_events_states=list,
         machine_addresses=list,
         sent_timestamp=float,
+        membership_version=int,
         operation_code=OperationCode.HEARTBEAT,
+        field_defaults=dict(membership_version=0, **ECHO_FIELD_DEFAULTS),
         fields_list_nested=dict(
             channel_events_states=BaseEvent,
-            machine_addresses=MachineAddress
+            machine_addresses=MachineAddress,
+            **ECHO_FIELDS_LIST_NESTED
+        ),
+        **ECHO_FIELDS
+    )
+):
+    """A machine's vote; its `machine_addresses` are only all of them when
+        its `membership_version` changes (see `PeerTable`), and otherwise
+        empty.
+    """
+
+    __slots__ = ()
+
+
+class DecisionRequest(
+    BaseRequest.add_fields_with_operation_code(
+        channel_states=list,
+        machine_addresses=list,
+        sent_timestamp=float,
+        operation_code=OperationCode.DECISION,
+        field_defaults=ECHO_FIELD_DEFAULTS,
+        fields_list_nested=dict(
+            channel_states=ChannelState,
+            machine_addresses=MachineAddress,
+            **ECHO_FIELDS_LIST_NESTED
+        ),
+        **ECHO_FIELDS
+    )
+):
+    """The `channel_states` decided by the aggregator (see
+        `Machine.aggregate`), and which `machine_addresses` it heard from.
+    """
+
+    __slots__ = ()
+
+
+class EventRequest(
+    BaseRequest.add_fields_with_operation_code(
+        events=list,
+        clocks=list,
+        origins=list,
+        sent_timestamps=list,
+        operation_code=OperationCode.EVENT,
+        fields_list_nested=dict(
+            events=BaseEvent,
+            clocks=int,
+            origins=int,
+            sent_timestamps=float
         )
     )
 ):
-    pass
+    """The `events` of the reactive protocol (see `Machine.reactive`), and
+        for each one, its logical clock, which machine it's from
+        (`origins`), and when that machine sent it.
+    """
+
+    __slots__ = ()
+
+
+class GossipRequest(
+    BaseRequest.add_fields_with_operation_code(
+        origins=list,
+        heartbeats=list,
+        operation_code=OperationCode.GOSSIP,
+        fields_list_nested=dict(
+            origins=int,
+            heartbeats=HeartbeatRequest
+        )
+    )
+):
+    """The `heartbeats` being gossiped (see `Machine.gossip`), and which
+        machine each one is from (`origins`).
+    """
+
+    __slots__ = ()
 
 
 class IdentityRequest(
@@ -365,10 +568,10 @@ class IdentityRequest(
         operation_code=OperationCode.IDENTITY
     )
 ):
-    pass
+    __slots__ = ()
 
 
 class RemoteStreamRequest(
-    Model.add_fields(chunk=int)
+    Model.add_fields(chunk=int, slots=True)
 ):
-    pass
+    __slots__ = ()
@@ -0,0 +1,1013 @@
+# peers.py
+# in synfony
+
+from collections import OrderedDict, deque
+from synfony.config import Config
+from synfony.enums import ConnectionState
+from threading import Condition, Event, Lock, Thread
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import math
+import random
+import time
+import zlib
+
+
+LOG10_E = math.log10(math.e)
+# `time.time()` and `time.monotonic()` at the same moment, see `ClockSync.now`.
+WALL_T0 = time.time()
+MONOTONIC_T0 = time.monotonic()
+
+
+class TimedLock:
+    """A `Lock` which keeps track of how long it is waited on and held, to
+        see how contended it is.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._acquired_t = 0.0
+
+        # the counters, see `stats`.
+        self.acquisitions = 0
+        self.max_hold = 0.0
+        self.max_wait = 0.0
+        self.total_hold = 0.0
+        self.total_wait = 0.0
+
+    def __enter__(self):
+        start_t = time.perf_counter()
+        self._lock.acquire()
+        self._acquired_t = time.perf_counter()
+        wait = self._acquired_t - start_t
+        self.acquisitions += 1
+        self.max_wait = max(self.max_wait, wait)
+        self.total_wait += wait
+        return self
+
+    def __exit__(self, *args):
+        hold = time.perf_counter() - self._acquired_t
+        self.max_hold = max(self.max_hold, hold)
+        self.total_hold += hold
+        self._lock.release()
+
+    def stats(self) -> Dict[str, float]:
+        """The counters: `acquisitions`, and the wait and hold times in
+            seconds.
+        """
+        return dict(
+            acquisitions=self.acquisitions,
+            max_hold=self.max_hold,
+            max_wait=self.max_wait,
+            total_hold=self.total_hold,
+            total_wait=self.total_wait
+        )
+
+    @staticmethod
+    def combine(stats: List[Dict[str, float]]) -> Dict[str, float]:
+        """Combine the `stats` of several locks, e.g. of one per peer.
+        """
+        return {key: (max if key.startswith('max') else sum)(
+                    [s[key] for s in stats] or [0])
+                for key in ['acquisitions',
+                            'max_hold',
+                            'max_wait',
+                            'total_hold',
+                            'total_wait']}
+
+
+class PeerTable:
+    """The `MachineAddress`es, and so their statuses, of every machine, which
+        are changed by the accepting, sending and `metronome` threads.
+
+        The membership (i.e. which machines there are, and where) has a
+        version (see `version_of`), so the heartbeats only need to have all
+        of the `MachineAddress`es once it changes, or doesn't match someone
+        else's (see `request_snapshot`).
+    """
+
+    def __init__(self, machine_addresses: List[Any]):
+        self._lock = TimedLock()
+        self._machine_addresses = machine_addresses
+        self._version = self.version_of(machine_addresses)
+        # so my first heartbeat has them all.
+        self._snapshot_due = True
+
+    def __len__(self) -> int:
+        return len(self._machine_addresses)
+
+    @staticmethod
+    def version_of(machine_addresses: List[Any]) -> int:
+        """The membership version of `machine_addresses`: a checksum of each
+            one's `idx`, `host` and `port` (not its status, since that's up
+            to whoever's looking), so it's the same on every machine which
+            knows of the same ones.
+        """
+        return zlib.crc32(';'.join(
+            f'{machine_address.get_idx()!s}@{machine_address.get_host()!s}:'
+            f'{machine_address.get_port()!s}'
+            for machine_address in machine_addresses
+            if machine_address is not None
+        ).encode())
+
+    def add(self, machine_address):
+        """Add (or replace) the `MachineAddress` of a machine.
+        """
+        idx = machine_address.get_idx()
+        with self._lock:
+            while idx >= len(self._machine_addresses):
+                self._machine_addresses.append(None)
+            self._machine_addresses[idx] = machine_address
+            self._update_version()
+
+    def merge(self, machine_addresses: List[Any]) -> bool:
+        """Add each of `machine_addresses` (e.g. from someone's snapshot)
+            which I don't know of yet, as down.
+
+            Returns: whether there were any.
+        """
+        with self._lock:
+            new = [machine_address for machine_address in machine_addresses
+                   if machine_address is not None and
+                   (machine_address.get_idx() >= len(self._machine_addresses)
+                    or self._machine_addresses[machine_address.get_idx()]
+                    is None)]
+            for machine_address in new:
+                machine_address.set_status(False)
+                while (machine_address.get_idx() >=
+                       len(self._machine_addresses)):
+                    self._machine_addresses.append(None)
+                self._machine_addresses[machine_address.get_idx()] = \
+                    machine_address
+            self._update_version()
+        return len(new) > 0
+
+    def _update_version(self):
+        version = self.version_of(self._machine_addresses)
+        if version != self._version:
+            self._version = version
+            self._snapshot_due = True
+
+    def get_version(self) -> int:
+        return self._version
+
+    def request_snapshot(self):
+        """Have my next heartbeat have all of the `MachineAddress`es, e.g.
+            once someone joins, or has a different version.
+        """
+        self._snapshot_due = True
+
+    def take_snapshot_due(self) -> bool:
+        """Whether my next heartbeat should have all of the
+            `MachineAddress`es (and then it's not due any more).
+        """
+        with self._lock:
+            due, self._snapshot_due = self._snapshot_due, False
+        return due
+
+    def get_machine_addresses(self) -> List[Any]:
+        """A copy of the `MachineAddress`es, e.g. to serialize.
+        """
+        with self._lock:
+            return list(self._machine_addresses)
+
+    def get_status(self, idx: int) -> bool:
+        with self._lock:
+            machine_address = self._machine_addresses[idx]
+            return machine_address is not None and machine_address.get_status()
+
+    def set_status(self, idx: int, status: bool, only_if_up: bool = False):
+        """Set the status of machine `idx`; if `only_if_up`, then only if it
+            was up, i.e. only to mark it down.
+        """
+        with self._lock:
+            machine_address = self._machine_addresses[idx]
+            if machine_address is None:
+                return
+            if not only_if_up or machine_address.get_status():
+                machine_address.set_status(status)
+
+    def lock_stats(self) -> Dict[str, float]:
+        return self._lock.stats()
+
+
+class ConnectionRegistry:
+    """The socket to each machine, by its index.
+    """
+
+    def __init__(self, n: int):
+        self._lock = TimedLock()
+        self._sockets: List[Any] = [None for _ in range(n)]
+
+    def get(self, idx: int):
+        with self._lock:
+            return self._sockets[idx] if idx < len(self._sockets) else None
+
+    def get_sockets(self) -> List[Any]:
+        """A copy of the sockets, `None` where not connected.
+        """
+        with self._lock:
+            return list(self._sockets)
+
+    def register(self, idx: int, s):
+        with self._lock:
+            while idx >= len(self._sockets):
+                self._sockets.append(None)
+            self._sockets[idx] = s
+
+    def unregister(self, idx: int):
+        """Forget the socket to machine `idx`, returning it (to close).
+        """
+        with self._lock:
+            if idx >= len(self._sockets):
+                return None
+            s, self._sockets[idx] = self._sockets[idx], None
+            return s
+
+    def lock_stats(self) -> Dict[str, float]:
+        return self._lock.stats()
+
+
+class FailureDetector:
+    """A phi-accrual failure detector: from the inter-arrival times of each
+        machine's heartbeats, `phi` is how unlikely (as `-log10` of the
+        probability, taking them as exponentially distributed) it is that a
+        heartbeat still hasn't come if that machine is up. So it adapts to
+        how often each machine's heartbeats actually arrive, and a suspected
+        machine is trusted again as soon as it's heard from.
+    """
+
+    def __init__(self,
+                 n: int,
+                 threshold: float = Config.PHI_THRESHOLD,
+                 window: int = Config.PHI_WINDOW):
+        self.threshold = threshold
+        self._intervals = [deque(maxlen=window) for _ in range(n)]
+        # until there's anything to go off of, then everyone is "just heard"
+        # from and sends every `Config.HANDSHAKE_INTERVAL`.
+        self._last = [time.monotonic() for _ in range(n)]
+        self._locks = [TimedLock() for _ in range(n)]
+
+    def heartbeat(self, idx: int, t: Optional[float] = None):
+        """Machine `idx` was heard from (at `t`, by `time.monotonic`).
+        """
+        t = time.monotonic() if t is None else t
+        with self._locks[idx]:
+            self._intervals[idx].append(max(t - self._last[idx], 0))
+            self._last[idx] = t
+
+    def phi(self, idx: int, t: Optional[float] = None) -> float:
+        """The suspicion level of machine `idx` (at `t`).
+        """
+        t = time.monotonic() if t is None else t
+        with self._locks[idx]:
+            intervals = self._intervals[idx]
+            mean = (sum(intervals) / len(intervals)
+                    if len(intervals) > 0 else Config.HANDSHAKE_INTERVAL)
+            delta = t - self._last[idx]
+        return max(delta, 0) / max(mean, Config.HANDSHAKE_TIMEOUT) * LOG10_E
+
+    def is_suspected(self, idx: int, t: Optional[float] = None) -> bool:
+        return self.phi(idx, t) > self.threshold
+
+    def get_trusted(self, my_idx: int, t: Optional[float] = None) -> List[int]:
+        """The indices of the machines that are not suspected (and mine).
+        """
+        return [idx for idx in range(len(self._locks))
+                if idx == my_idx or not self.is_suspected(idx, t)]
+
+    def lock_stats(self) -> Dict[str, float]:
+        return TimedLock.combine([lock.stats() for lock in self._locks])
+
+
+class Backoff:
+    """Exponential backoff, with jitter so that everyone retrying doesn't do
+        so all at the same time: the `n`th delay is uniformly in the upper
+        half of `min(base * 2 ** n, cap)`.
+    """
+
+    def __init__(self,
+                 base: float = Config.RECONNECT_BACKOFF_MIN,
+                 cap: float = Config.RECONNECT_BACKOFF_MAX):
+        self.attempts = 0
+        self.base = base
+        self.cap = cap
+
+    def next_delay(self) -> float:
+        delay = min(self.base * (1 << min(self.attempts, 32)), self.cap)
+        self.attempts += 1
+        return random.uniform(delay / 2, delay)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class ReconnectManager:
+    """Keeps a connection up to each of its peers (by some `key`), on a
+        thread per peer which (re)connects with `Backoff` between failed
+        attempts. Then once the connection is reported `disconnected`, e.g.
+        after an error mid-session, it's closed and re-established the same
+        way.
+    """
+
+    def __init__(self,
+                 sockets,
+                 on_connect: Optional[Callable] = None):
+        self.sockets = sockets
+        self.on_connect = on_connect
+
+        self._condition = Condition()
+        self._running = True
+        self._sockets: Dict[Any, Any] = {}
+        self._states: Dict[Any, ConnectionState] = {}
+
+    def connect(self,
+                key,
+                machine_address,
+                handshake: Optional[Callable] = None,
+                timeout: Optional[float] = None):
+        """Start keeping a connection to `machine_address` up, as `key`;
+            `handshake` is called on each new socket, before `on_connect`.
+        """
+        with self._condition:
+            if self._states.get(key, ConnectionState.CLOSED) != \
+                    ConnectionState.CLOSED:
+                return
+            self._states[key] = ConnectionState.DISCONNECTED
+        Thread(target=self.run,
+               args=[key, machine_address, handshake, timeout],
+               daemon=True).start()
+
+    def run(self, key, machine_address, handshake, timeout):
+        backoff = Backoff()
+        while True:
+            with self._condition:
+                while (self._running and
+                       self._states[key] == ConnectionState.CONNECTED):
+                    self._condition.wait()
+                if not self.is_running(key):
+                    return
+                self._states[key] = ConnectionState.CONNECTING
+
+            s = None
+            try:
+                s = self.sockets.start_socket(
+                    machine_address=machine_address,
+                    timeout=timeout,
+                    connect=True
+                )
+                if handshake is not None:
+                    handshake(s)
+                if self.on_connect is not None:
+                    self.on_connect(key, s)
+            except Exception:
+                if s is not None:
+                    self.close(s)
+                with self._condition:
+                    if not self.is_running(key):
+                        return
+                    self._states[key] = ConnectionState.BACKING_OFF
+                    self._condition.wait_for(lambda: not self._running,
+                                             backoff.next_delay())
+                    if not self.is_running(key):
+                        return
+                    self._states[key] = ConnectionState.DISCONNECTED
+                continue
+
+            backoff.reset()
+            with self._condition:
+                if not self.is_running(key):
+                    self.close(s)
+                    return
+                self._sockets[key] = s
+                self._states[key] = ConnectionState.CONNECTED
+                self._condition.notify_all()
+
+    def is_running(self, key) -> bool:
+        return (self._running and
+                self._states.get(key) != ConnectionState.CLOSED)
+
+    def close(self, s):
+        try:
+            self.sockets.close(s)
+        except Exception:
+            pass
+
+    def disconnected(self, key, s) -> bool:
+        """Report that socket `s` (of `key`) failed, so close it and
+            reconnect; unless it's already been replaced.
+        """
+        with self._condition:
+            if s is None or self._sockets.get(key) is not s:
+                return False
+            self._sockets[key] = None
+            self._states[key] = ConnectionState.DISCONNECTED
+            self._condition.notify_all()
+        self.close(s)
+        return True
+
+    def get_socket(self, key):
+        with self._condition:
+            return self._sockets.get(key)
+
+    def get_state(self, key) -> ConnectionState:
+        with self._condition:
+            return self._states.get(key, ConnectionState.CLOSED)
+
+    def wait_connected(self, key, timeout: Optional[float] = None):
+        """Wait until `key` is connected (or `timeout`), returning its socket
+            (or `None`).
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: (not self.is_running(key) or
+                         self._states.get(key) == ConnectionState.CONNECTED),
+                timeout
+            )
+            return self._sockets.get(key)
+
+    def remove(self, key):
+        """Stop keeping `key` connected, and close its socket.
+        """
+        with self._condition:
+            s = self._sockets.pop(key, None)
+            self._states[key] = ConnectionState.CLOSED
+            self._condition.notify_all()
+        if s is not None:
+            self.close(s)
+
+    def stop(self):
+        """Stop reconnecting, and close all of the sockets.
+        """
+        with self._condition:
+            self._running = False
+            sockets = [s for s in self._sockets.values() if s is not None]
+            self._sockets.clear()
+            self._states = {key: ConnectionState.CLOSED
+                            for key in self._states}
+            self._condition.notify_all()
+        [self.close(s) for s in sockets]
+
+
+class PeerSender:
+    """A long-lived sender to one peer, which drains a bounded, latest-wins
+        outbound queue: once it is full, the oldest message is dropped, since
+        a newer heartbeat supersedes it anyway. So a slow peer only delays
+        (or drops) its own messages, rather than stalling the round.
+    """
+
+    def __init__(self,
+                 sockets,
+                 s,
+                 idx: int,
+                 on_status: Optional[Callable] = None,
+                 max_len: int = Config.OUTBOUND_QUEUE_LEN,
+                 on_failure: Optional[Callable] = None):
+        self.sockets = sockets
+        self.s = s
+        self.idx = idx
+        self.on_failure = on_failure
+        self.on_status = on_status
+
+        self._condition = Condition()
+        self._queue = deque(maxlen=max_len)
+        self._running = True
+
+        # the counters, see `stats`.
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+        self._thread = Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def send(self, data: bytes):
+        """Queue `data` to be sent, dropping the oldest queued message if the
+            queue is full.
+        """
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append((time.time(), data))
+            self._condition.notify()
+
+    def run(self):
+        """Send whatever is queued, until `stop`ped. A failed send is not
+            retried, the next message will replace it.
+        """
+        while True:
+            with self._condition:
+                while self._running and len(self._queue) == 0:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                queued_t, data = self._queue.popleft()
+                s = self.s
+
+            try:
+                if s is None:
+                    raise ConnectionError('Not connected.')
+                self.sockets.sendall(s, data)
+                status = True
+            except Exception:
+                status = False
+                if self.on_failure is not None and s is not None:
+                    self.on_failure(self.idx, s)
+            latency = time.time() - queued_t
+
+            with self._condition:
+                if status:
+                    self.sent += 1
+                    self.last_latency = latency
+                    self.max_latency = max(self.max_latency, latency)
+                    self.total_latency += latency
+                else:
+                    self.failed += 1
+            if self.on_status is not None:
+                self.on_status(self.idx, status)
+
+    def set_socket(self, s):
+        """Send on `s` from now on, e.g. once reconnected.
+        """
+        with self._condition:
+            self.s = s
+
+    def stop(self):
+        """Stop sending, dropping anything still queued.
+        """
+        with self._condition:
+            self._running = False
+            self._queue.clear()
+            self._condition.notify()
+
+    def stats(self) -> Dict[str, float]:
+        """The counters: messages `sent`, `dropped` (superseded while
+            queued), `failed`, still `queued`, and the send latencies (from
+            being queued until `sendall` returns) in seconds.
+        """
+        with self._condition:
+            return dict(
+                sent=self.sent,
+                dropped=self.dropped,
+                failed=self.failed,
+                queued=len(self._queue),
+                last_latency=self.last_latency,
+                mean_latency=(self.total_latency / self.sent
+                              if self.sent > 0 else 0.0),
+                max_latency=self.max_latency
+            )
+
+
+class VoteSlots:
+    """The newest vote (`HeartbeatRequest`) of each machine in this round,
+        along with when it arrived and in which round. A newer vote just
+        replaces the older one, under that machine's own lock, so the
+        receiving threads never wait on each other.
+    """
+
+    def __init__(self, n: int):
+        self._locks = [TimedLock() for _ in range(n)]
+        self._round = 0
+        self._slots: List[Optional[Tuple[Any, float, int]]] = \
+            [None for _ in range(n)]
+        # notified when a slot is first filled in a round.
+        self._voted = Condition()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get_round(self) -> int:
+        return self._round
+
+    def put(self, idx: int, vote):
+        """Keep `vote` as the newest one from machine `idx`.
+        """
+        with self._locks[idx]:
+            first = self._slots[idx] is None
+            self._slots[idx] = (vote, time.time(), self._round)
+        if first:
+            with self._voted:
+                self._voted.notify_all()
+
+    def full(self, idxes: Optional[List[int]] = None) -> bool:
+        """Whether every machine (or each of `idxes`) has voted this round.
+        """
+        return all(self._slots[idx] is not None
+                   for idx in (range(len(self._slots))
+                               if idxes is None else idxes))
+
+    def wait_full(self,
+                  timeout: Optional[float] = None,
+                  idxes: Optional[List[int]] = None) -> bool:
+        """Wait until every machine (or each of `idxes`) has voted this
+            round, or `timeout`.
+        """
+        with self._voted:
+            return self._voted.wait_for(lambda: self.full(idxes), timeout)
+
+    def take(self) -> List[Optional[Tuple[Any, float, int]]]:
+        """Empty the slots, returning their `(vote, arrival time, round)`s
+            (or `None` for no vote), and start the next round.
+        """
+        slots = []
+        for idx, lock in enumerate(self._locks):
+            with lock:
+                slots.append(self._slots[idx])
+                self._slots[idx] = None
+        self._round += 1
+        return slots
+
+    def lock_stats(self) -> Dict[str, float]:
+        return TimedLock.combine([lock.stats() for lock in self._locks])
+
+
+class LeaderElection:
+    """Which machine aggregates the votes (see `Machine.aggregate`): the
+        first of the machines the last decision was heard from (to start, all
+        of them), which hasn't been deposed for missing a round; so every
+        machine which heard that decision picks the same one.
+    """
+
+    def __init__(self, n: int, timeout: float = Config.AGGREGATION_TIMEOUT):
+        self.timeout = timeout
+        self._candidates = list(range(n))
+        self._deposed = set()
+        self._leader = None
+        self._decided_t = time.monotonic()
+
+    def get_leader(self, my_idx: int) -> int:
+        leader = min([idx for idx in self._candidates
+                      if idx not in self._deposed] + [my_idx])
+        if leader != self._leader:
+            # give a new leader a whole `timeout` to decide.
+            self._leader = leader
+            self._decided_t = time.monotonic()
+        return leader
+
+    def decided(self, idx: int, candidates: List[int]):
+        """Machine `idx` decided, having heard from the `candidates`.
+        """
+        self._candidates = sorted(set(candidates) | {idx})
+        self._deposed.discard(idx)
+        if idx == self._leader:
+            self._decided_t = time.monotonic()
+
+    def check_leader(self) -> bool:
+        """Depose the leader if it hasn't decided within `timeout`.
+
+            Returns: whether it was deposed.
+        """
+        if (self._leader is None or
+                time.monotonic() - self._decided_t <= self.timeout):
+            return False
+        self._deposed.add(self._leader)
+        return True
+
+
+def gossip_neighbors(idx: int, n: int, base: int = Config.GOSSIP_BASE
+                     ) -> List[int]:
+    """The machines that machine `idx` (of `n`) gossips with (see
+        `Machine.gossip`): those `m * base ** k` away from it either way
+        around the ring, for each `0 < m < base` and `base ** k < n`.
+
+        So each machine has at most `2 * (base - 1) * ceil(log_base(n))`
+        neighbors, every machine is its neighbor's neighbor, and any two are
+        at most `ceil(log_base(n))` hops (i.e. rounds) apart, since that's
+        how many digits (in base `base`) the distance between them has.
+    """
+    base = max(base, 2)
+    neighbors = set()
+    step = 1
+    while step < n:
+        for m in range(1, base):
+            neighbors.add((idx + m * step) % n)
+            neighbors.add((idx - m * step) % n)
+        step *= base
+    neighbors.discard(idx)
+    return sorted(neighbors)
+
+
+class GossipView:
+    """The heartbeats heard from each machine (directly or relayed), by
+        their `sent_timestamp`s; so a repeated one (e.g. coming around
+        another way) is dropped, rather than passed on again. Each new one is
+        both passed on and voted with, since (unlike a `VoteSlots` one) it
+        can't be replaced by a newer one, which may not have the same events.
+    """
+
+    def __init__(self, n: int, window: int = 64):
+        self._lock = TimedLock()
+        self._seen = [deque(maxlen=window) for _ in range(n)]
+        # the new ones since the last `take_relay` (`take_votes`).
+        self._relay: List[Tuple[int, Any]] = []
+        self._votes: List[Any] = []
+
+    def merge(self,
+              origin: int,
+              heartbeat,
+              copy: Optional[Callable] = None) -> bool:
+        """Keep `heartbeat` from machine `origin`, if it is new; voting with
+            `copy(heartbeat)` instead, if given.
+
+            Returns: whether it was.
+        """
+        with self._lock:
+            if heartbeat.get_sent_timestamp() in self._seen[origin]:
+                return False
+            self._seen[origin].append(heartbeat.get_sent_timestamp())
+            self._relay.append((origin, heartbeat))
+            self._votes.append(heartbeat if copy is None else
+                               copy(heartbeat))
+        return True
+
+    def take_relay(self) -> List[Tuple[int, Any]]:
+        """The new `(origin, heartbeat)`s to pass on.
+        """
+        with self._lock:
+            relay, self._relay = self._relay, []
+        return relay
+
+    def take_votes(self) -> List[Any]:
+        """The new heartbeats to vote with.
+        """
+        with self._lock:
+            votes, self._votes = self._votes, []
+        return votes
+
+    def lock_stats(self) -> Dict[str, float]:
+        return self._lock.stats()
+
+
+class ReactiveState:
+    """The events each channel is at, for the reactive protocol (see
+        `Machine.reactive`). Each event is stamped with a Lamport clock, and
+        a channel is at the ones with the latest clock it's heard of; those
+        of the same clock are concurrent, so they're all kept (and
+        `choice_func` picks between them). So any machines which have heard
+        the same events are at the same state, whatever order they came in.
+    """
+
+    def __init__(self):
+        self._clock = 0
+        # channel -> (clock, {origin: (event, sent timestamp)})
+        self._channels: Dict[int, Tuple[int, Dict[int, Tuple[Any, float]]]] \
+            = {}
+        self._changed = set()
+        self._condition = Condition()
+        self._notified = False
+        self._lock = TimedLock()
+        # when the last `snapshot` was taken, by `time.monotonic`.
+        self.snapshot_t = time.monotonic()
+
+    def tick(self) -> int:
+        """The clock of my next event.
+        """
+        with self._lock:
+            self._clock += 1
+            return self._clock
+
+    def merge(self,
+              clock: int,
+              origin: int,
+              event,
+              sent_timestamp: float) -> bool:
+        """Keep `event` from machine `origin` if it's at least as late as
+            what its channel is at (and not already kept).
+
+            Returns: whether it was.
+        """
+        channel = event.get_channel_state().get_idx()
+        with self._lock:
+            self._clock = max(self._clock, clock)
+            channel_clock, events = self._channels.get(channel, (-1, {}))
+            if clock < channel_clock or (clock == channel_clock and
+                                         origin in events):
+                return False
+            if clock > channel_clock:
+                events = {}
+                self._channels[channel] = (clock, events)
+            events[origin] = (event, sent_timestamp)
+            self._changed.add(channel)
+        self.notify()
+        return True
+
+    def get_events(self, channel: int) -> List[Tuple[int, Any, float]]:
+        """The `(origin, event, sent timestamp)`s `channel` is at, in order
+            of `origin`.
+        """
+        with self._lock:
+            _, events = self._channels.get(channel, (-1, {}))
+            return [(origin, event, sent_timestamp)
+                    for origin, (event, sent_timestamp)
+                    in sorted(events.items())]
+
+    def snapshot(self) -> List[Tuple[int, int, Any, float]]:
+        """The `(clock, origin, event, sent timestamp)`s of every channel.
+        """
+        with self._lock:
+            self.snapshot_t = time.monotonic()
+            return [(clock, origin, event, sent_timestamp)
+                    for _, (clock, events) in sorted(self._channels.items())
+                    for origin, (event, sent_timestamp)
+                    in sorted(events.items())]
+
+    def take_changed(self) -> List[int]:
+        """The channels which have changed since the last `take_changed`.
+        """
+        with self._lock:
+            changed, self._changed = sorted(self._changed), set()
+        return changed
+
+    def notify(self):
+        """Wake up `wait`, e.g. once there are new events of my own.
+        """
+        with self._condition:
+            self._notified = True
+            self._condition.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until `notify` (since the last `wait`), or `timeout`.
+
+            Returns: whether it was notified.
+        """
+        with self._condition:
+            notified = self._condition.wait_for(lambda: self._notified,
+                                                timeout)
+            self._notified = False
+        return notified
+
+    def lock_stats(self) -> Dict[str, float]:
+        return self._lock.stats()
+
+
+class ClockSync:
+    """Estimates of each peer's clock offset (theirs minus mine) and round
+        trip time, NTP-style: each heartbeat echoes, for each peer, when that
+        peer sent its last one and when I got it; so once I get the next one
+        back, I have all four timestamps of an exchange, i.e. `t1` (I sent),
+        `t2` (they got it), `t3` (they sent theirs) and `t4` (I got it), and
+
+            offset = ((t2 - t1) + (t3 - t4)) / 2
+            rtt = (t4 - t1) - (t3 - t2).
+
+        Of the last `window` samples of each peer, the estimate is the one
+        with the least `rtt`, since it's the least thrown off by queueing.
+
+        A peer is only echoed once per heartbeat I hear from it, and at most
+        `max_echoes` of them in each of mine (those waiting the longest), so
+        the heartbeats stay small however many machines there are.
+    """
+
+    def __init__(self,
+                 n: int,
+                 my_idx: int,
+                 window: int = Config.CLOCK_SYNC_WINDOW,
+                 max_echoes: int = Config.CLOCK_SYNC_ECHOES):
+        self.max_echoes = max_echoes
+        self.my_idx = my_idx
+        self._lock = TimedLock()
+        # when each peer last sent me something, and when I got it.
+        self._heard: List[Optional[Tuple[float, float]]] = \
+            [None for _ in range(n)]
+        # the peers heard since they were last echoed, oldest first.
+        self._unechoed: OrderedDict = OrderedDict()
+        self._samples = [deque(maxlen=window) for _ in range(n)]
+
+    @staticmethod
+    def now() -> float:
+        """`time.time()`, but measured by `time.monotonic()`, so it doesn't
+            jump (e.g. when the system clock is set).
+        """
+        return WALL_T0 + (time.monotonic() - MONOTONIC_T0)
+
+    def received(self,
+                 idx: int,
+                 sent_timestamp: float,
+                 echo_idxes: List[int],
+                 echo_sent_timestamps: List[float],
+                 echo_received_timestamps: List[float],
+                 t: Optional[float] = None):
+        """Machine `idx` sent me something at `sent_timestamp` (by its
+            clock) that I got at `t` (by `now`), with its echoes.
+        """
+        t4 = self.now() if t is None else t
+        with self._lock:
+            self._heard[idx] = (sent_timestamp, t4)
+            self._unechoed.setdefault(idx, None)
+            for echo_idx, t1, t2 in zip(echo_idxes,
+                                        echo_sent_timestamps,
+                                        echo_received_timestamps):
+                if echo_idx != self.my_idx:
+                    continue
+                rtt = (t4 - t1) - (sent_timestamp - t2)
+                if rtt >= 0:
+                    self._samples[idx].append(
+                        (((t2 - t1) + (sent_timestamp - t4)) / 2, rtt))
+
+    def get_echoes(self, idxes: Optional[List[int]] = None
+                   ) -> Tuple[List[int], List[float], List[float]]:
+        """The `(idxes, sent timestamps, received timestamps)` to echo to
+            `idxes` (or anyone), i.e. whoever of them I've heard from since I
+            last echoed them, up to `max_echoes`.
+        """
+        with self._lock:
+            echoed = [idx for idx in self._unechoed
+                      if idxes is None or idx in idxes][:self.max_echoes]
+            [self._unechoed.pop(idx) for idx in echoed]
+            heard = [(idx, self._heard[idx]) for idx in echoed]
+        return ([idx for idx, _ in heard],
+                [sent_timestamp for _, (sent_timestamp, _) in heard],
+                [received_timestamp for _, (_, received_timestamp) in heard])
+
+    def rtts(self) -> List[float]:
+        """The `rtt` of every sample of every machine.
+        """
+        with self._lock:
+            return [rtt for samples in self._samples for _, rtt in samples]
+
+    def estimate(self, idx: int) -> Optional[Tuple[float, float]]:
+        """The `(offset, rtt)` of machine `idx`, if there are any samples.
+        """
+        with self._lock:
+            samples = list(self._samples[idx])
+        if len(samples) == 0:
+            return None
+        return min(samples, key=lambda sample: sample[1])
+
+    def to_local(self, idx: int, timestamp: float) -> float:
+        """`timestamp` by machine `idx`'s clock, by mine (as is, until there
+            is an estimate).
+        """
+        estimate = self.estimate(idx)
+        return timestamp if estimate is None else timestamp - estimate[0]
+
+    def stats(self) -> Dict[int, Dict[str, float]]:
+        """The estimates of each machine which has any.
+        """
+        return {idx: dict(offset=estimate[0],
+                          rtt=estimate[1],
+                          samples=len(self._samples[idx]))
+                for idx, estimate in ((idx, self.estimate(idx))
+                                      for idx in range(len(self._samples)))
+                if estimate is not None}
+
+    def lock_stats(self) -> Dict[str, float]:
+        return self._lock.stats()
+
+
+class RoundScheduler:
+    """How long each round of the `metronome` is: `min_interval` while there
+        are events, then longer by `backoff` each round without any, up to
+        `max_interval`; and how long a round waits for votes, from the
+        measured round trip times (see `ClockSync`). `wake` starts the next
+        round right away, e.g. once there's an event.
+    """
+
+    def __init__(self,
+                 min_interval: float = Config.HANDSHAKE_INTERVAL_MIN,
+                 max_interval: float = Config.HANDSHAKE_INTERVAL_MAX,
+                 backoff: float = Config.ADAPTIVE_BACKOFF):
+        self.backoff = backoff
+        self.interval = min_interval
+        self.max_interval = max_interval
+        self.min_interval = min_interval
+        self._woken = Event()
+
+    @staticmethod
+    def percentile(values: List[float], q: float) -> float:
+        """The `q`th (in [0, 1]) percentile of `values`, by nearest rank.
+        """
+        values = sorted(values)
+        return values[min(max(math.ceil(q * len(values)) - 1, 0),
+                          len(values) - 1)]
+
+    def observe(self, active: bool):
+        """A round passed, and `active` is whether it had any events.
+        """
+        self.interval = (self.min_interval if active else
+                         min(self.interval * self.backoff, self.max_interval))
+
+    def heartbeat_timeout(self, rtts: List[float]) -> float:
+        """How long to wait for votes, given the measured `rtts`.
+        """
+        if len(rtts) == 0:
+            return min(Config.HEARTBEAT_TIMEOUT, self.interval)
+        return min(max(Config.RTT_TIMEOUT_FACTOR *
+                       self.percentile(rtts, Config.RTT_PERCENTILE),
+                       Config.HEARTBEAT_TIMEOUT_MIN),
+                   self.interval)
+
+    def wake(self):
+        self._woken.set()
+
+    def sleep(self, timeout: float) -> bool:
+        """Wait for `timeout`, unless woken.
+
+            Returns: whether it was woken.
+        """
+        woken = self._woken.wait(timeout)
+        self._woken.clear()
+        return woken
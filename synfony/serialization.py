@@ -1,9 +1,10 @@
 # serialization.py
 # in synfony
 
+from collections.abc import Sequence
 from math import log
 from synfony.config import Config
-from typing import Callable, Optional
+from typing import Callable, List, Optional, Tuple
 
 import struct
 
@@ -27,18 +28,126 @@ LIST_LEN_BYTES = int(log(Config.LIST_MAX_LEN) / 8) + 1
 STR_LEN_BYTES = int(log(Config.STR_MAX_LEN) / 8) + 1
 
 
+def fixed_width(fmt: str,
+                pack: Optional[Callable] = None,
+                unpack: Optional[Callable] = None) -> Callable:
+    """Mark a (de)serializer as fixed-width, i.e. equivalent to a single
+        little-endian `struct` format code `fmt`, after converting values
+        with `pack` (before packing) and `unpack` (after unpacking).
+
+        `Model.compile_codec` uses these to fold runs of fields into one
+        precomputed `struct.Struct`.
+    """
+    def decorator(func: Callable) -> Callable:
+        func.fixed_width = (fmt, pack, unpack)
+        return func
+    return decorator
+
+
+def int_fixed_width(length: int = INT_LEN_BYTES) -> Callable:
+    """`fixed_width` for `int`s of `length` many little-endian bytes;
+        `struct` has no codes for odd lengths, so pack them as `bytes`.
+    """
+    if length == 1:
+        return fixed_width('B', pack=int)
+    return fixed_width(f'{length!s}s',
+                       pack=lambda v: int(v).to_bytes(length,
+                                                      byteorder='little'),
+                       unpack=lambda b: int.from_bytes(b, byteorder='little'))
+
+
+def deserializes_from(deserialize_from: Callable) -> Callable:
+    """Mark a deserializer as having an offset-returning counterpart, i.e.
+        `deserialize_from(data, offset) -> (val, new_offset)`, so callers
+        can walk one buffer without slicing or re-serializing to measure.
+    """
+    def decorator(func: Callable) -> Callable:
+        func.deserialize_from = getattr(deserialize_from,
+                                        '__func__',
+                                        deserialize_from)
+        return func
+    return decorator
+
+
+def skips_from(skip_from: Callable) -> Callable:
+    """Mark an offset-returning deserializer as having a counterpart which
+        only finds where the value ends, i.e.
+        `skip_from(data, offset) -> new_offset`, without deserializing it.
+    """
+    def decorator(func: Callable) -> Callable:
+        func.skip_from = getattr(skip_from, '__func__', skip_from)
+        return func
+    return decorator
+
+
+class LazyList(Sequence):
+    """A `list` whose items are deserialized from a buffer on first read,
+        from the item offsets found when it was made (so unread items never
+        become Python objects). Items are kept once read, so mutations stick.
+    """
+
+    # marks items which haven't been read yet (since `None` could be one).
+    _UNREAD = object()
+
+    def __init__(self,
+                 data: bytes,
+                 offsets: List[int],
+                 item_deserialize_from: Callable):
+        self._data = data
+        self._offsets = offsets
+        self._items = [LazyList._UNREAD] * len(offsets)
+        self._item_deserialize_from = item_deserialize_from
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        item = self._items[idx]
+        if item is LazyList._UNREAD:
+            item, _ = self._item_deserialize_from(self._data,
+                                                  self._offsets[idx])
+            self._items[idx] = item
+        return item
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (list, LazyList)):
+            return NotImplemented
+        return len(self) == len(other) and list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
 class SerializationUtils:
     """A bunch of helpers for serialization of standard types.
+
+        Each `deserialize_*_from` takes a buffer (`bytes` or `memoryview`)
+        and an offset into it, and returns the value along with the offset
+        just after it; each `deserialize_*` is the same from offset `0`.
     """
 
     @staticmethod
+    def deserialize_bool_from(data: bytes,
+                              offset: int = 0) -> Tuple[bool, int]:
+        """Deserialize a `bool` encoded at `offset` in a `bytes`.
+            It will be length 1.
+        """
+        return (bool.from_bytes(data[offset:offset + 1], byteorder='little'),
+                offset + 1)
+
+    @staticmethod
+    @fixed_width('?')
+    @deserializes_from(deserialize_bool_from)
     def deserialize_bool(data: bytes) -> bool:
         """Deserialize a `bool` encoded in a `bytes`.
             It will be length 1.
         """
-        return bool.from_bytes(data[:1], byteorder='little')
+        return SerializationUtils.deserialize_bool_from(data)[0]
 
     @staticmethod
+    @fixed_width('?')
     def serialize_bool(val: bool) -> bytes:
         """Serialize a `bool` into a `bytes`.
             It will be length 1.
@@ -46,6 +155,16 @@ class SerializationUtils:
         return bool(val).to_bytes(1, byteorder='little')
 
     @staticmethod
+    def deserialize_float_from(data: bytes,
+                               offset: int = 0) -> Tuple[float, int]:
+        """Deserialize `bytes` at `offset` into an `float`.
+        """
+        return (struct.unpack_from('<d', data, offset)[0],
+                offset + FLOAT_LEN_BYTES)
+
+    @staticmethod
+    @fixed_width('d')
+    @deserializes_from(deserialize_float_from)
     def deserialize_float(data: bytes) -> float:
         """Deserialize `bytes` into an `float`.
         """
@@ -54,25 +173,39 @@ class SerializationUtils:
         #     return float(SerializationUtils.deserialize_str(data))
         # except:
         #     return None
-        return struct.unpack('d', data[:FLOAT_LEN_BYTES])[0]
+        return SerializationUtils.deserialize_float_from(data)[0]
 
     @staticmethod
+    @fixed_width('d')
     def serialize_float(val: float) -> bytes:
         """Serialize an `float` into a `bytes`.
         """
         # TODO: less hack
         # return SerializationUtils.serialize_str(str(val))
-        return struct.pack('d', val)
+        return struct.pack('<d', val)
 
     @staticmethod
+    def deserialize_int_from(data: bytes,
+                             offset: int = 0,
+                             length: int = INT_LEN_BYTES) -> Tuple[int, int]:
+        """Deserialize `bytes` at `offset` into an `int`.
+            It will be length `length`.
+        """
+        return (int.from_bytes(data[offset:offset + length],
+                               byteorder='little'),
+                offset + length)
+
+    @staticmethod
+    @int_fixed_width()
+    @deserializes_from(deserialize_int_from)
     def deserialize_int(data: bytes, length: int = INT_LEN_BYTES) -> int:
         """Deserialize `bytes` into an `int`.
             It will be length `length`.
         """
-        return int.from_bytes(data[:min(length, len(data))],
-                              byteorder='little')
+        return SerializationUtils.deserialize_int_from(data, length=length)[0]
 
     @staticmethod
+    @int_fixed_width()
     def serialize_int(val: int, length: int = INT_LEN_BYTES) -> bytes:
         """Serialize an `int` into a `bytes`.
             It will be length `length`.
@@ -80,12 +213,33 @@ class SerializationUtils:
         return int(val).to_bytes(length, byteorder='little')
 
     @staticmethod
+    def skip_str_from(data: bytes, offset: int = 0) -> int:
+        """The offset just after the `str` encoded at `offset` in `bytes`.
+        """
+        length, offset = SerializationUtils.deserialize_int_from(
+            data,
+            offset,
+            length=STR_LEN_BYTES)
+        return offset + length
+
+    @staticmethod
+    @skips_from(skip_str_from)
+    def deserialize_str_from(data: bytes,
+                             offset: int = 0) -> Tuple[str, int]:
+        """Deserialize `bytes` at `offset` into a `str`.
+        """
+        length, offset = SerializationUtils.deserialize_int_from(
+            data,
+            offset,
+            length=STR_LEN_BYTES)
+        return str(data[offset:offset + length], 'utf-8'), offset + length
+
+    @staticmethod
+    @deserializes_from(deserialize_str_from)
     def deserialize_str(data: bytes) -> str:
         """Deserialize `bytes` into a `str`.
         """
-        length = SerializationUtils.deserialize_int(data[:STR_LEN_BYTES],
-                                                    length=STR_LEN_BYTES)
-        return data[STR_LEN_BYTES:length + STR_LEN_BYTES].decode('utf-8')
+        return SerializationUtils.deserialize_str_from(data)[0]
 
     @staticmethod
     def serialize_str(val: str) -> bytes:
@@ -98,6 +252,82 @@ class SerializationUtils:
             len(encoded),
             length=STR_LEN_BYTES) + encoded
 
+    @staticmethod
+    def deserializer_from(item_deserialize: Callable,
+                          item_serialize: Callable) -> Callable:
+        """The offset-returning counterpart of `item_deserialize`, if it was
+            marked by `deserializes_from`. Otherwise, fall back to figuring
+            out how far to seek ahead using `len(item_serialize(...))` on the
+            deserialized object.
+        """
+        deserialize_from = getattr(item_deserialize, 'deserialize_from', None)
+        if deserialize_from is not None:
+            return deserialize_from
+
+        def __impl_deserialize_from__(data: bytes, offset: int = 0):
+            val = item_deserialize(data[offset:])
+            return val, offset + len(item_serialize(val))
+
+        return __impl_deserialize_from__
+
+    @staticmethod
+    def deserialize_list_from(data: bytes,
+                              offset: int,
+                              item_deserialize_from: Callable,
+                              remain: Optional[int] = None) -> Tuple[list,
+                                                                     int]:
+        """Deserialize `bytes` at `offset` into a `list` using some explicit
+            offset-returning item deserialization. First few `bytes` are the
+            length of the `list` (unless `remain` is given), then we use
+            `item_deserialize_from` to get each item and where the next one
+            starts.
+        """
+        if remain is None:
+            remain, offset = SerializationUtils.deserialize_int_from(
+                data,
+                offset,
+                length=LIST_LEN_BYTES)
+        items = []
+        for _ in range(remain):
+            item, offset = item_deserialize_from(data, offset)
+            items.append(item)
+        return items, offset
+
+    @staticmethod
+    def skip_list_from(data: bytes,
+                       offset: int,
+                       item_skip_from: Callable) -> int:
+        """The offset just after the `list` encoded at `offset` in `bytes`,
+            using `item_skip_from` to find where each item ends.
+        """
+        remain, offset = SerializationUtils.deserialize_int_from(
+            data,
+            offset,
+            length=LIST_LEN_BYTES)
+        for _ in range(remain):
+            offset = item_skip_from(data, offset)
+        return offset
+
+    @staticmethod
+    def deserialize_list_lazy_from(
+            data: bytes,
+            offset: int,
+            item_deserialize_from: Callable,
+            item_skip_from: Callable) -> Tuple[LazyList, int]:
+        """Index the `list` encoded at `offset` in `bytes` into a `LazyList`,
+            using `item_skip_from` to find where each item starts, and
+            `item_deserialize_from` once each item is read.
+        """
+        remain, offset = SerializationUtils.deserialize_int_from(
+            data,
+            offset,
+            length=LIST_LEN_BYTES)
+        offsets = []
+        for _ in range(remain):
+            offsets.append(offset)
+            offset = item_skip_from(data, offset)
+        return LazyList(data, offsets, item_deserialize_from), offset
+
     @staticmethod
     def deserialize_list(data: bytes,
                          item_deserialize: Callable,
@@ -105,49 +335,30 @@ class SerializationUtils:
                          remain: Optional[int] = None) -> bytes:
         """Deserialize `bytes` into a `list` using some explicit item
             (de)serialization. First few `bytes` are the length of the `list`,
-            then we use `item_deserialize` to get each item, figure out how
-            far to seek ahead using `len(item_serialize(...))` on the
-            deserialized object.
+            then we use `item_deserialize` to get each item (see
+            `deserializer_from` for how far to seek ahead).
         """
-        if remain is None:
-            length = SerializationUtils.deserialize_int(data[:LIST_LEN_BYTES],
-                                                        length=LIST_LEN_BYTES)
-            return SerializationUtils.deserialize_list(data[LIST_LEN_BYTES:],
-                                                       item_deserialize,
-                                                       item_serialize,
-                                                       remain=length)
-        elif remain == 0:
-            return []
-        else:
-            obj = item_deserialize(data)
-            length = len(item_serialize(obj))
-            return [obj] + SerializationUtils.deserialize_list(
-                data[length:],
-                item_deserialize,
-                item_serialize,
-                remain=remain - 1)
+        return SerializationUtils.deserialize_list_from(
+            data,
+            0,
+            SerializationUtils.deserializer_from(item_deserialize,
+                                                 item_serialize),
+            remain=remain)[0]
 
     @staticmethod
     def serialize_list(val: list,
                        item_serialize: Callable,
                        remain: Optional[int] = None) -> bytes:
         """Serialize `list` into `bytes` using some explicit item
-            serialization. First few `bytes` are the length of the `list`,
-            then we use `item_serialize` for each item and concat the results.
+            serialization. First few `bytes` are the length of the `list`
+            (unless `remain` is given), then we use `item_serialize` for each
+            item and concat the results.
         """
         if val is None:
             val = []
-        if remain is None:
-            val = val[:Config.LIST_MAX_LEN]
-            return (SerializationUtils.serialize_int(len(val),
-                                                     length=LIST_LEN_BYTES) +
-                    SerializationUtils.serialize_list(val,
-                                                      item_serialize,
-                                                      remain=len(val)))
-        elif remain == 0:
-            return b''
-        else:
-            return (item_serialize(val[0]) +
-                    SerializationUtils.serialize_list(val[1:],
-                                                      item_serialize,
-                                                      remain=remain - 1))
+        if remain is not None:
+            return b''.join(item_serialize(item) for item in val[:remain])
+        val = val[:Config.LIST_MAX_LEN]
+        return (SerializationUtils.serialize_int(len(val),
+                                                 length=LIST_LEN_BYTES) +
+                b''.join(item_serialize(item) for item in val))
@@ -2,8 +2,85 @@
 # in synfony
 
 from abc import ABC
-from socket import AF_INET, SHUT_RDWR, SOCK_STREAM, socket
+from socket import AF_INET, IPPROTO_IP, IPPROTO_UDP, SHUT_RDWR, SOCK_DGRAM
+from socket import IP_ADD_MEMBERSHIP, IP_MULTICAST_IF, IP_MULTICAST_LOOP
+from socket import IP_MULTICAST_TTL, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
+from socket import inet_aton, socket
 from synfony.config import Config
+from typing import Iterator, Optional, Tuple
+
+import struct
+import threading
+import time
+
+
+# the header of a datagram (see `MulticastUDPSockets`), i.e. the `idx` of its
+# sender, then its sequence number.
+DATAGRAM_HEADER = struct.Struct('<HQ')
+
+# the header of a frame, i.e. the length of the message which follows it.
+FRAME_HEADER = struct.Struct('<I')
+
+
+class FrameDecoder:
+    """A receive buffer which reassembles length-prefixed frames (see
+        `FramedTCPSockets`) from a stream, which may have merged or split
+        them arbitrarily.
+    """
+
+    def __init__(self, max_len: int = Config.FRAME_MAX_LEN):
+        self._buffer = bytearray()
+        self._offset = 0
+        self.max_len = max_len
+
+    @staticmethod
+    def encode(data: bytes) -> bytes:
+        """Frame `data`, i.e. prefix it by its length.
+        """
+        return FRAME_HEADER.pack(len(data)) + data
+
+    def feed(self, data: bytes):
+        """Append some received `bytes` to the buffer.
+        """
+        self._buffer += data
+
+    def next_frame(self) -> Optional[bytes]:
+        """Pop the next complete frame off of the buffer, or `None` if it
+            hasn't all been received yet.
+
+            Raises: A `ValueError` if the frame is longer than `max_len`
+                    (i.e. the stream is not actually framed).
+        """
+        if len(self._buffer) - self._offset < FRAME_HEADER.size:
+            return None
+        (length,) = FRAME_HEADER.unpack_from(self._buffer, self._offset)
+        if length > self.max_len:
+            raise ValueError(f'Frame of length {length!s} is longer than '
+                             f'{self.max_len!s}.')
+        start = self._offset + FRAME_HEADER.size
+        if len(self._buffer) < start + length:
+            return None
+
+        frame = bytes(self._buffer[start:start + length])
+        self._offset = start + length
+
+        # reuse the buffer, rather than shifting it on every frame.
+        if self._offset == len(self._buffer):
+            self._buffer.clear()
+            self._offset = 0
+        elif self._offset > Config.PACKET_MAX_LEN:
+            del self._buffer[:self._offset]
+            self._offset = 0
+        return frame
+
+    def frames(self, data: bytes = b'') -> Iterator[bytes]:
+        """Feed `data`, then yield every complete frame in the buffer.
+        """
+        self.feed(data)
+        frame = self.next_frame()
+        while frame is not None:
+            yield frame
+            frame = self.next_frame()
 
 
 class BaseSockets(ABC):
@@ -58,7 +135,7 @@ class TCPSockets(BaseSockets):
 
     @classmethod
     def send(cls, connection, data):
-        raise connection.send(data)
+        return connection.send(data)
 
     @classmethod
     def sendall(cls, s, data):
@@ -88,3 +165,152 @@ class TCPSockets(BaseSockets):
                  machine_address.get_port())
             )
         return s
+
+
+class FramedTCPSockets(TCPSockets):
+    """`TCPSockets`, but where every `send` / `sendall` is one length-prefixed
+        frame, and `recv` returns exactly one whole frame (or `b''` once the
+        connection is closed), however TCP merged or split them.
+    """
+
+    # the `FrameDecoder` of each connection, since `recv` may have read
+    # past the end of the frame it returned.
+    _decoders = {}
+
+    _lock = threading.Lock()
+
+    @classmethod
+    def decoder(cls, connection) -> FrameDecoder:
+        with cls._lock:
+            decoder = cls._decoders.get(connection, None)
+            if decoder is None:
+                decoder = FrameDecoder()
+                cls._decoders[connection] = decoder
+        return decoder
+
+    @classmethod
+    def close(cls, s):
+        with cls._lock:
+            cls._decoders.pop(s, None)
+        super().close(s)
+
+    @classmethod
+    def recv(cls, connection):
+        decoder = cls.decoder(connection)
+        frame = decoder.next_frame()
+        while frame is None:
+            data = connection.recv(Config.PACKET_MAX_LEN)
+            if len(data) == 0:
+                return b''
+            decoder.feed(data)
+            frame = decoder.next_frame()
+        return frame
+
+    @classmethod
+    def send(cls, connection, data):
+        return cls.sendall(connection, data)
+
+    @classmethod
+    def sendall(cls, s, data):
+        return s.sendall(FrameDecoder.encode(data))
+
+
+class MulticastUDPSockets(BaseSockets):
+    """Messages (i.e. `HeartbeatRequest`s) multicast over UDP, to the group
+        (and port) of the `machine_address`, so that each one is sent once,
+        rather than to every other machine. Each datagram is tagged with its
+        sender's `idx` and a sequence number, and `recv` is latest-wins: it
+        drops a datagram older than one already received from that sender,
+        since a lost (or late) heartbeat is superseded by the next one anyways.
+
+        With `Config.MULTICAST_LOOPBACK`, everything stays on `127.0.0.1`,
+        e.g. for running several machines on one host.
+    """
+
+    # the `[idx, sequence number]` of each sending socket.
+    _sent = {}
+    # the latest sequence number from each sender, of each receiving socket.
+    _received = {}
+
+    _lock = threading.Lock()
+
+    @classmethod
+    def close(cls, s):
+        with cls._lock:
+            cls._sent.pop(s, None)
+            cls._received.pop(s, None)
+        s.close()
+
+    @classmethod
+    def recv(cls, connection):
+        return cls.recv_from(connection)[1]
+
+    @classmethod
+    def recv_from(cls, connection) -> Tuple[int, bytes]:
+        """Receive the next datagram which is newer than any received from
+            its sender.
+
+            Returns: the `idx` of its sender, and the message.
+        """
+        while True:
+            datagram = connection.recv(Config.DATAGRAM_MAX_LEN)
+            if len(datagram) < DATAGRAM_HEADER.size:
+                continue
+            idx, sequence = DATAGRAM_HEADER.unpack_from(datagram)
+            with cls._lock:
+                received = cls._received.setdefault(connection, {})
+                if sequence <= received.get(idx, -1):
+                    continue
+                received[idx] = sequence
+            return idx, datagram[DATAGRAM_HEADER.size:]
+
+    @classmethod
+    def send(cls, connection, data):
+        return cls.sendall(connection, data)
+
+    @classmethod
+    def sendall(cls, s, data):
+        with cls._lock:
+            sent = cls._sent[s]
+            sent[1] += 1
+            idx, sequence = sent
+        return s.send(DATAGRAM_HEADER.pack(idx, sequence) + data)
+
+    @classmethod
+    def shutdown(cls, s):
+        pass
+
+    @classmethod
+    def start_socket(cls,
+                     machine_address,
+                     timeout=None,
+                     bind=False,
+                     connect=False):
+        """Join the group of `machine_address` if `bind`, or send to it (as
+            `machine_address.get_idx()`) if `connect`.
+        """
+        group = machine_address.get_host()
+        interface = '127.0.0.1' if Config.MULTICAST_LOOPBACK else '0.0.0.0'
+        s = socket(AF_INET, SOCK_DGRAM, IPPROTO_UDP)
+        s.settimeout(timeout)
+        if bind:
+            # so that every machine on this host can join.
+            s.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+            s.bind(('', machine_address.get_port()))
+            s.setsockopt(IPPROTO_IP,
+                         IP_ADD_MEMBERSHIP,
+                         inet_aton(group) + inet_aton(interface))
+            with cls._lock:
+                cls._received[s] = {}
+        if connect:
+            s.setsockopt(IPPROTO_IP, IP_MULTICAST_TTL, Config.MULTICAST_TTL)
+            s.setsockopt(IPPROTO_IP, IP_MULTICAST_LOOP, 1)
+            if Config.MULTICAST_LOOPBACK:
+                s.setsockopt(IPPROTO_IP, IP_MULTICAST_IF, inet_aton(interface))
+            s.connect((group, machine_address.get_port()))
+            # starting from the time, so that a restarted machine's datagrams
+            # are still newer than the ones from before it restarted.
+            with cls._lock:
+                cls._sent[s] = [machine_address.get_idx(),
+                                time.time_ns() // 1000]
+        return s
@@ -2,14 +2,110 @@
 # in synfony
 
 from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
 from synfony.config import Config
 from synfony.models import ChannelState, MachineAddress, RemoteStreamRequest
-from synfony.sockets import TCPSockets
-from threading import Thread, Timer
+from synfony.peers import ReconnectManager
+from synfony.sockets import FramedTCPSockets
+from threading import Condition, Thread, Timer
 from time import sleep, time
+from typing import Any, Callable, List
 
 import pygame
 
+try:
+    import numpy
+except ImportError:
+    # it's optional, see `LocalMusicStreamer.correct_drift`.
+    numpy = None
+
+
+class ChunkCache:
+    """The `capacity` most recently used of a channel's decoded chunks (from
+        `load`); `prefetch` decodes chunks on a background thread, so `get`
+        doesn't have to, so long as they're asked for ahead of time.
+    """
+
+    def __init__(self,
+                 load: Callable[[int], Any],
+                 capacity: int = Config.CHUNK_CACHE_SIZE):
+        self.hits = 0
+        self.misses = 0
+        self._capacity = capacity
+        self._chunks = OrderedDict()
+        self._condition = Condition()
+        self._load = load
+        self._loading = set()
+        self._queue = deque()
+        self._thread = None
+
+    def get(self, chunk: int):
+        """The decoded `chunk`; decoded now, if it isn't yet (or waits for
+            the background thread, if it's decoding it).
+        """
+        with self._condition:
+            while chunk in self._loading:
+                self._condition.wait()
+            if chunk in self._chunks:
+                self.hits += 1
+                self._chunks.move_to_end(chunk)
+                return self._chunks[chunk]
+            self.misses += 1
+            self._loading.add(chunk)
+        sound = None
+        try:
+            sound = self._load(chunk)
+        finally:
+            self._put(chunk, sound)
+        return sound
+
+    def prefetch(self, chunks: List[int]):
+        """Decode `chunks` in the background (in order), rather than any
+            asked for before; and keep them, if they already are.
+        """
+        with self._condition:
+            [self._chunks.move_to_end(chunk)
+             for chunk in chunks
+             if chunk in self._chunks]
+            self._queue = deque(chunk for chunk in chunks
+                                if chunk not in self._chunks)
+            if self._thread is None:
+                self._thread = Thread(target=self.run, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while len(self._queue) == 0:
+                    self._condition.wait()
+                chunk = self._queue.popleft()
+                if chunk in self._chunks or chunk in self._loading:
+                    continue
+                self._loading.add(chunk)
+            sound = None
+            try:
+                sound = self._load(chunk)
+            except Exception:
+                # then `get` tries again, and raises it.
+                pass
+            finally:
+                self._put(chunk, sound)
+
+    def _put(self, chunk: int, sound):
+        with self._condition:
+            self._loading.discard(chunk)
+            if sound is not None:
+                self._chunks[chunk] = sound
+                self._chunks.move_to_end(chunk)
+                while len(self._chunks) > self._capacity:
+                    self._chunks.popitem(last=False)
+            self._condition.notify_all()
+
+    def __contains__(self, chunk: int) -> bool:
+        with self._condition:
+            return chunk in self._chunks
+
 
 class BaseStreamer(ABC):
     def __init__(self, channel_id):
@@ -71,6 +167,23 @@ class BaseStreamer(ABC):
     def sync(self, state):
         pass
 
+    def is_synced(self, state: ChannelState) -> bool:
+        """Whether `sync`ing `state` would change nothing that matters, i.e.
+            this is already at it: its times are within
+            `Config.TOLERABLE_DELAY` of `state`'s (accounting for the time
+            since it was last synced). While playing, the last time moves
+            along every round, but it's only used once paused (and pausing
+            syncs it), so then it isn't compared.
+        """
+        return (not self.is_seeking() and
+                self.is_playing() == state.get_playing() and
+                self.get_volume() == state.get_volume() and
+                (state.get_playing() or
+                 abs(state.get_last_timestamp() - self.get_last_time()) <=
+                 Config.TOLERABLE_DELAY) and
+                abs(state.get_timestamp() - self.get_current_time()) <=
+                Config.TOLERABLE_DELAY)
+
     @classmethod
     def shutdown(self):
         pygame.mixer.stop()
@@ -122,6 +235,9 @@ class AllStreamer(BaseStreamer):
     def seek(self, chunk, playing):
         assert False
 
+    def is_synced(self, state):
+        return all(streamer.is_synced(state) for streamer in self.streamers)
+
     def sync(self, state):
         for streamer in self.streamers:
             streamer.sync(state)
@@ -130,9 +246,14 @@ class AllStreamer(BaseStreamer):
 class LocalMusicStreamer(BaseStreamer):
     def __init__(self, channel_id):
         super().__init__(channel_id)
+        self.chunks = ChunkCache(self.load_chunk)
         self.current_chunk_index = 1
         self.current_chunk_realtime = 0.0
         self.current_chunk_timestamp = 0.0
+        # how much (in seconds) it's behind (if positive) the consensus, and
+        # how fast the current chunk is playing (see `correct_drift`).
+        self.drift = 0.0
+        self.rate = 1.0
         self.last_timestamp = 0.0
         self.playing = False
         self.timer = None
@@ -163,22 +284,104 @@ class LocalMusicStreamer(BaseStreamer):
             interval = Config.CHANNELS[self.channel_id][2]
             self.schedule_seek(chunk, interval, True)
         else:
+            # it's really at the end of the chunk now, so it's that much
+            # less (or more) behind.
+            if self.drift != 0:
+                self.drift -= (self.current_chunk_index *
+                               Config.CHANNELS[self.channel_id][2] -
+                               self.get_current_time())
+            sound, rate = self.correct_drift(sound)
             channel = pygame.mixer.Channel(self.channel_id)
             channel.queue(sound)
             self.current_chunk_index = chunk
             self.current_chunk_realtime = time()
             self.current_chunk_timestamp = 0.0
+            self.rate = rate
+
+    def is_synced(self, state):
+        # while correcting drift, `sync` keeps `drift` up to date.
+        return self.drift == 0 and super().is_synced(state)
 
     def get_chunk(self, chunk):
+        sound = self.chunks.get(chunk)
+        self.prefetch(chunk)
+        return sound
+
+    def get_chunk_from(self, chunk, offset):
+        """The `chunk` from `offset` (in seconds) in, to the nearest sample,
+            sliced from its decoded samples; or `None` if it isn't available.
+        """
+        sound = self.get_chunk(chunk)
+        if sound is None or offset <= 0:
+            return sound
+        frequency, size, channels = pygame.mixer.get_init()
+        frame_size = abs(size) // 8 * channels
+        samples = sound.get_raw()
+        start = min(round(offset * frequency),
+                    len(samples) // frame_size) * frame_size
+        return pygame.mixer.Sound(buffer=samples[start:])
+
+    def correct_drift(self, sound):
+        """`sound` (the next chunk) resampled to play up to
+            `Config.DRIFT_MAX_RATE` faster (or slower), to make up as much of
+            the `drift` (set by `sync`) as it can; and how fast it plays.
+        """
+        if (not Config.DRIFT_CORRECTION_ENABLED or numpy is None or
+                abs(self.drift) <= Config.TOLERABLE_DELAY):
+            # close enough, so it's done.
+            self.drift = 0.0
+            return sound, 1.0
+        length = Config.CHANNELS[self.channel_id][2]
+        rate = 1.0 + max(min(self.drift / length, Config.DRIFT_MAX_RATE),
+                         -Config.DRIFT_MAX_RATE)
+        _, size, channels = pygame.mixer.get_init()
+        self.drift -= length - length / rate
+        return (pygame.mixer.Sound(buffer=self.resample(sound.get_raw(),
+                                                        rate,
+                                                        size,
+                                                        channels)),
+                rate)
+
+    @staticmethod
+    def resample(samples: bytes, rate: float, size: int, channels: int
+                 ) -> bytes:
+        """The `samples` (of `size` bits, signed if negative, in `channels`
+            channels, as in `pygame.mixer.get_init`) resampled to play `rate`
+            times as fast, i.e. `1 / rate` as long.
+        """
+        dtype = (numpy.float32 if size == 32 else
+                 numpy.dtype(f'{"i" if size < 0 else "u"}{abs(size) // 8}'))
+        frames = numpy.frombuffer(samples, dtype=dtype).reshape(-1, channels)
+        # linearly interpolated, which is fine for a few percent.
+        at = numpy.linspace(0,
+                            len(frames) - 1,
+                            max(round(len(frames) / rate), 1))
+        return numpy.stack([numpy.interp(at,
+                                         numpy.arange(len(frames)),
+                                         frames[:, c])
+                            for c in range(channels)],
+                           axis=1).round().astype(dtype).tobytes()
+
+    def load_chunk(self, chunk):
         file = Config.CHANNELS[self.channel_id][0]
         chunk_str = str(chunk) if chunk > 9 else "0" + str(chunk)
         return pygame.mixer.Sound(file + "-" + chunk_str + ".mp3")
 
+    def prefetch(self, chunk):
+        """Decode the `Config.CHUNK_PREFETCH` chunks after `chunk` in the
+            background, and the first one (since a seek to the start is
+            likely).
+        """
+        chunks = Config.CHANNELS[self.channel_id][1]
+        self.chunks.prefetch([(chunk + i - 1) % chunks + 1
+                              for i in range(1, Config.CHUNK_PREFETCH + 1)] +
+                             [1])
+
     def get_current_time(self):
         inter_chunk_offset = ((self.current_chunk_index - 1) *
                               Config.CHANNELS[self.channel_id][2])
         intra_chunk_offset = self.current_chunk_timestamp
-        realtime_offset = time() - self.current_chunk_realtime
+        realtime_offset = (time() - self.current_chunk_realtime) * self.rate
         if not self.playing:
             realtime_offset = 0.0
         return inter_chunk_offset + intra_chunk_offset + realtime_offset
@@ -206,6 +409,8 @@ class LocalMusicStreamer(BaseStreamer):
         chunk += 1
         if chunk > Config.CHANNELS[self.channel_id][1]:
             chunk = 1
+        # so it's decoded by the time the `timer` is up.
+        self.prefetch(chunk - 1)
         self.current_chunk_index = chunk
         self.current_chunk_timestamp = 0.0
         self.playing = False
@@ -218,6 +423,8 @@ class LocalMusicStreamer(BaseStreamer):
     def seek(self, chunk, playing):
         self.current_chunk_index = chunk
         self.current_chunk_timestamp = 0.0
+        self.drift = 0.0
+        self.rate = 1.0
         self.playing = playing
         self.timer = None
         sound = self.get_chunk(chunk)
@@ -238,28 +445,64 @@ class LocalMusicStreamer(BaseStreamer):
                 channel.pause()
             channel.set_endevent(pygame.USEREVENT + self.channel_id)
 
+    def seek_within(self, chunk, offset, playing):
+        """Start `chunk` from `offset` (in seconds) in, right away, rather
+            than waiting until the next chunk (like `schedule_seek`).
+
+            Returns: whether it could, i.e. the chunk is available.
+        """
+        if chunk > Config.CHANNELS[self.channel_id][1]:
+            return False
+        sound = self.get_chunk_from(chunk, offset)
+        if sound is None:
+            return False
+        channel = pygame.mixer.Channel(self.channel_id)
+        channel.set_endevent(pygame.USEREVENT + len(Config.CHANNELS))
+        channel.play(sound)
+        if not playing:
+            channel.pause()
+        channel.set_endevent(pygame.USEREVENT + self.channel_id)
+        self.current_chunk_index = chunk
+        self.current_chunk_realtime = time()
+        self.current_chunk_timestamp = offset
+        self.drift = 0.0
+        self.rate = 1.0
+        self.playing = playing
+        return True
+
     def sync(self, state: ChannelState):
         last_timestamp = state.get_last_timestamp()
         playing = state.get_playing()
         timestamp = state.get_timestamp()
         volume = state.get_volume()
         chunk = 1
-        delay = abs(timestamp - self.get_current_time())
+        drift = timestamp - self.get_current_time()
+        delay = abs(drift)
         while timestamp > Config.CHANNELS[self.channel_id][2]:
             timestamp -= Config.CHANNELS[self.channel_id][2]
             chunk += 1
         channel = pygame.mixer.Channel(self.channel_id)
-        if delay > Config.TOLERABLE_DELAY or self.timer is not None:
+        if (Config.DRIFT_CORRECTION_ENABLED and numpy is not None and
+                self.timer is None and self.playing and playing and
+                delay <= Config.DRIFT_MAX_DELAY):
+            # catch up (or slow down) over the next chunks, rather than
+            # stopping to seek; see `correct_drift`.
+            self.drift = drift if delay > Config.TOLERABLE_DELAY else 0.0
+        elif delay > Config.TOLERABLE_DELAY or self.timer is not None:
             if self.timer:
                 self.timer.cancel()
+                self.timer = None
             channel.set_endevent(pygame.USEREVENT + len(Config.CHANNELS))
             channel.stop()
             channel.set_endevent(pygame.USEREVENT + self.channel_id)
-            interval = Config.CHANNELS[self.channel_id][2] - timestamp
-            self.schedule_seek(chunk, interval, playing)
+            if not self.seek_within(chunk, timestamp, playing):
+                interval = Config.CHANNELS[self.channel_id][2] - timestamp
+                self.schedule_seek(chunk, interval, playing)
         elif self.playing and not playing:
             channel.pause()
-            self.current_chunk_timestamp = time() - self.current_chunk_realtime
+            # since it may have started part way in (see `seek_within`).
+            self.current_chunk_timestamp += \
+                (time() - self.current_chunk_realtime) * self.rate
             self.playing = False
         elif not self.playing and playing:
             channel.unpause()
@@ -271,7 +514,7 @@ class LocalMusicStreamer(BaseStreamer):
 
 
 class RemoteMusicStream():
-    sockets = TCPSockets
+    sockets = FramedTCPSockets
 
     def accept(self):
         host, port = tuple(Config.STREAMS[self.machine_id][0].split(":"))
@@ -289,8 +532,8 @@ class RemoteMusicStream():
                 pass
 
     def recv(self, connection):
-        while True:
-            try:
+        try:
+            while True:
                 request = self.sockets.recv(connection)
                 if len(request) == 0:
                     break
@@ -303,8 +546,11 @@ class RemoteMusicStream():
                     sleep(Config.REMOTE_DELAY_SHORT)
                 response = b'1'
                 self.sockets.send(connection, response)
-            except Exception:
-                pass
+        except Exception:
+            # the streamer went away, see `RemoteMusicStreamer.connect`.
+            pass
+        finally:
+            self.sockets.close(connection)
 
     def __init__(self, machine_id):
         self.machine_id = machine_id
@@ -312,27 +558,21 @@ class RemoteMusicStream():
 
 
 class RemoteMusicStreamer(LocalMusicStreamer):
-    sockets = TCPSockets
+    sockets = FramedTCPSockets
+    # shared by every channel's streamer, by `channel_id`.
+    reconnects = ReconnectManager(FramedTCPSockets)
 
     def connect(self):
+        host, port = tuple(Config.STREAMS[self.machine_id][0].split(":"))
+        machine_address = MachineAddress(host=host, port=int(port))
+        self.reconnects.connect(self.channel_id, machine_address)
         while True:
-            try:
-                host, port = tuple(
-                    Config.STREAMS[self.machine_id][0].split(":")
-                )
-                machine_address = MachineAddress(host=host, port=int(port))
-                s = self.sockets.start_socket(
-                    machine_address=machine_address,
-                    timeout=None,
-                    connect=True
-                )
+            if False not in self.downloaded:
+                break
+            s = self.reconnects.wait_connected(self.channel_id)
+            if s is None:
                 break
-            except Exception:
-                pass
-        while True:
             try:
-                if False not in self.downloaded:
-                    break
                 chunk = self.prioritized
                 while self.downloaded[chunk]:
                     chunk += 1
@@ -343,10 +583,11 @@ class RemoteMusicStreamer(LocalMusicStreamer):
                 self.sockets.sendall(s, request)
                 response = self.sockets.recv(s)
                 if len(response) == 0:
-                    break
+                    raise ConnectionError('Stream closed.')
                 self.downloaded[chunk] = True
             except Exception:
-                pass
+                self.reconnects.disconnected(self.channel_id, s)
+        self.reconnects.remove(self.channel_id)
 
     def __init__(self, channel_id):
         self.downloaded = [False
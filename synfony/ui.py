@@ -18,10 +18,25 @@ import math
 import pygame
 
 
+class EventQueue(list):
+    """The user's events (see `synfony.callbacks`), which also calls each of
+        its `listeners` once one is added, e.g. to send it out right away
+        (see `Machine.reactive`).
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.listeners = []
+
+    def append(self, event):
+        super().append(event)
+        [listener() for listener in self.listeners]
+
+
 class BaseUI(ABC):
     def __init__(self):
         self.streamers = []
-        self.event_queue = []
+        self.event_queue = EventQueue()
 
     @abstractmethod
     def init(machine_id):
@@ -441,7 +456,7 @@ class SeekSlider():
 
 class UI(BaseUI):
     channel = BaseStreamer.get_num_channels()
-    event_queue = []
+    event_queue = EventQueue()
     fps_clock = pygame.time.Clock()
     objects = []
     screen = pygame.display.set_mode(
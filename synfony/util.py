@@ -2,10 +2,11 @@
 # in synfony
 
 from enum import Enum, EnumMeta
-from synfony.serialization import SerializationUtils
+from synfony.serialization import SerializationUtils, deserializes_from
 from typing import Callable, Dict, List, Optional, Type
 
 import builtins
+import struct
 
 
 class Interface(object):
@@ -24,10 +25,14 @@ class Model(object):
        Useful for making new models, or (de)serializing.
     """
 
+    # so that `model_with_fields(slots=True)` subclasses have no `__dict__`.
+    __slots__ = ()
+
     # the fields and their types
     _fields: Dict[str, type] = {}
 
-    # the fields and their defaults (not necessary)
+    # the fields and their defaults (not necessary); a `list` one is copied
+    # for each instance.
     _field_defaults: Dict[str, object] = {}
 
     # the fields and their deserializers
@@ -44,23 +49,56 @@ class Model(object):
     # the order to (de)serialize fields in.
     _order_of_fields: List[str] = {}
 
+    # the fields and the names of the attributes they're kept in.
+    _private_names: Dict[str, str] = {}
+
+    # whether the fields are kept in `__slots__` rather than a `__dict__`.
+    _slotted: bool = False
+
+    # the compiled (de)serialization of `_order_of_fields`, made by
+    # `compile_codec`. each entry is either a `(struct.Struct, plan, None,
+    # None)` for a run of fixed-width fields, or a `(None, private_name,
+    # serialize, deserialize_from)` for a variable-width one.
+    _codec: List[tuple] = []
+
+    # the same as `_codec`, but for `deserialize_lazy_from` and `skip_from`;
+    # each entry is either a `(struct.Struct, plan, None, None)`, or a
+    # `(None, private_name, deserialize_lazy_from, skip_from)`.
+    _lazy_codec: List[tuple] = []
+
+    # the `struct.Struct` of every field, if they are all fixed-width
+    # (i.e. `_codec` is a single run), otherwise `None`.
+    _struct: Optional[struct.Struct] = None
+
+    # the subclass made by `lazy_model`, only set once it is first needed.
+    _lazy_model: Optional[type] = None
+
     # TODO: is this necessary? I think not necessarily, but will
     # be at a minimum useful for awkard class attributes sharing object
     # attributes names, so best to just discourage it entirely.
-    _reserved_fields = ['fields',
+    _reserved_fields = ['codec',
+                        'fields',
                         'field_defaults'
                         'field_deserializers',
                         'field_serializers',
                         'order_of_fields',
+                        'private_names',
                         'fields_list_nested',
-                        'reserved_fields']
+                        'lazy_codec',
+                        'lazy_fields',
+                        'lazy_model',
+                        'reserved_fields',
+                        'slotted',
+                        'struct']
 
     def __eq__(self, other) -> bool:
         """Test for equality on every field's `__eq__`
         """
-        return len([n for n in self._fields
-                    if getattr(self, f'get_{n!s}', lambda: None)() !=
-                    getattr(other, f'get_{n!s}', lambda: None)()]) == 0
+        for private_name in self._private_names.values():
+            if (getattr(self, private_name, None) !=
+                    getattr(other, private_name, None)):
+                return False
+        return True
 
     def __str__(self) -> str:
         """Concatenates every field's `__str__`
@@ -115,7 +153,10 @@ class Model(object):
                 if t is None:
                     return None
                 if issubclass(t, Model):
-                    return lambda x: x.serialize()
+                    serializer = (lambda x: x.serialize())
+                    # so `fixed_width_field` knows it may flatten `t`.
+                    serializer.nested_model = t
+                    return serializer
                 return None
 
     @staticmethod
@@ -123,10 +164,79 @@ class Model(object):
         """The default list deserializer if we can deduce the items'
             default deserializers (via `default_deserializer`).
         """
-        return (lambda d: SerializationUtils.deserialize_list(
-                    d,
-                    Model.default_deserializer(t),
-                    Model.default_serializer(t)))
+        item_deserialize_from = Model.field_deserializer_from(
+            Model.default_deserializer(t),
+            Model.default_serializer(t))
+
+        def __impl_deserialize_list_from__(data: bytes, offset: int = 0):
+            return SerializationUtils.deserialize_list_from(
+                data,
+                offset,
+                item_deserialize_from)
+
+        item_skip_from = Model.field_skipper_from(item_deserialize_from)
+
+        def __impl_skip_list_from__(data: bytes, offset: int = 0):
+            return SerializationUtils.skip_list_from(data,
+                                                     offset,
+                                                     item_skip_from)
+
+        def __impl_deserialize_list_lazy_from__(data: bytes, offset: int = 0):
+            return SerializationUtils.deserialize_list_lazy_from(
+                data,
+                offset,
+                item_deserialize_from,
+                item_skip_from)
+
+        __impl_deserialize_list_from__.skip_from = __impl_skip_list_from__
+        __impl_deserialize_list_from__.deserialize_lazy_from = \
+            __impl_deserialize_list_lazy_from__
+
+        @deserializes_from(__impl_deserialize_list_from__)
+        def __impl_deserialize_list__(data: bytes):
+            return __impl_deserialize_list_from__(data)[0]
+
+        return __impl_deserialize_list__
+
+    @staticmethod
+    def field_deserializer_from(deserializer: Callable,
+                                serializer: Callable) -> Callable:
+        """The offset-returning counterpart of a field's `deserializer`,
+            i.e. `deserialize_from` for `Model`s, or see
+            `SerializationUtils.deserializer_from`.
+        """
+        model = getattr(deserializer, '__self__', None)
+        if (isinstance(model, type) and issubclass(model, Model) and
+                deserializer == model.deserialize):
+            return model.deserialize_from
+        return SerializationUtils.deserializer_from(deserializer, serializer)
+
+    @staticmethod
+    def field_skipper_from(deserialize_from: Callable) -> Callable:
+        """The counterpart of a field's `deserialize_from` which only finds
+            where the value ends, i.e. `skip_from` for `Model`s, or whatever
+            was marked by `skips_from` (else just deserialize it).
+        """
+        model = getattr(deserialize_from, '__self__', None)
+        if isinstance(model, type) and issubclass(model, Model):
+            return model.skip_from
+        skip_from = getattr(deserialize_from, 'skip_from', None)
+        if skip_from is not None:
+            return skip_from
+        return lambda data, offset: deserialize_from(data, offset)[1]
+
+    @staticmethod
+    def field_lazy_deserializer_from(deserialize_from: Callable) -> Callable:
+        """The lazy counterpart of a field's `deserialize_from`, i.e.
+            `deserialize_lazy_from` for `Model`s, `LazyList`s for `list`s of
+            them (else just deserialize it).
+        """
+        model = getattr(deserialize_from, '__self__', None)
+        if isinstance(model, type) and issubclass(model, Model):
+            return model.deserialize_lazy_from
+        return getattr(deserialize_from,
+                       'deserialize_lazy_from',
+                       deserialize_from)
 
     @staticmethod
     def default_list_serializer(t: Type) -> Callable:
@@ -139,42 +249,199 @@ class Model(object):
 
     @classmethod
     def deserialize(cls, data: bytes):
-        """Deserialize a `Model` according to its `order_of_fields` and
-            `field_deserializers`.
+        """Deserialize a `Model` according to its compiled `codec`, i.e. its
+            `order_of_fields` and `field_deserializers`.
 
             Can cause some headaches on optional arguments, so assume there
             are no `None` values.
         """
+        return cls.deserialize_from(data)[0]
+
+    @classmethod
+    def peek_model(cls, data: bytes, offset: int = 0) -> type:
+        """The `Model` to deserialize at `offset` in `data`. Just `cls`,
+            unless overridden to peek at e.g. an `OperationCode`.
+        """
+        return cls
+
+    @classmethod
+    def deserialize_from(cls, data: bytes, offset: int = 0):
+        """Deserialize a `Model` at `offset` in `data`, the same as
+            `deserialize`.
+
+            Returns: the `Model` and the offset just after it.
+        """
+        model = cls.peek_model(data, offset)
+        if model is not cls:
+            return model.deserialize_from(data, offset)
+
         # TODO: this can get screw-y with optionals.
         # a janky way of doing it without more code would be just doing it
         # on lists (of max len 1).
-        obj = cls()
-        for name in cls._order_of_fields:
-            deserializer = cls._field_deserializers[name]
-            serializer = cls._field_serializers[name]
-
-            field_val = deserializer(data)
-            length = len(serializer(field_val))
-
-            getattr(obj, f'set_{name!s}', lambda _: obj)(field_val)
-            try:
-                data = data[length:]
-            except Exception:
-                break
-        return obj
+        obj = cls.__new__(cls)
+        for layout, plan, _, deserialize_from in cls._codec:
+            if layout is not None:
+                Model.unpack_fields(obj,
+                                    plan,
+                                    layout.unpack_from(data, offset),
+                                    0)
+                offset += layout.size
+            else:
+                field_val, offset = deserialize_from(data, offset)
+                setattr(obj, plan, field_val)
+        return obj, offset
+
+    @classmethod
+    def deserialize_lazy(cls, data: bytes):
+        """Deserialize a `Model` lazily (see `deserialize_lazy_from`),
+            through a `memoryview` of `data` so nothing is copied.
+        """
+        return cls.deserialize_lazy_from(memoryview(data))[0]
+
+    @classmethod
+    def deserialize_lazy_from(cls, data: bytes, offset: int = 0):
+        """Index a `Model` at `offset` in `data`, only deserializing each
+            run of fixed-width fields when one of them is first read (see
+            `lazy_model`); `list`s become `LazyList`s, and nested `Model`s
+            are lazy too.
+
+            Returns: the `Model` and the offset just after it.
+        """
+        model = cls.peek_model(data, offset)
+        if model is not cls:
+            return model.deserialize_lazy_from(data, offset)
+
+        lazy_model = cls.lazy_model()
+        obj = lazy_model.__new__(lazy_model)
+        lazy_fields = {}
+        for layout, plan, deserialize_lazy_from, _ in cls._lazy_codec:
+            if layout is not None:
+                run = (data, offset, layout, plan)
+                for private_name, _, _, _ in plan:
+                    lazy_fields[private_name] = run
+                offset += layout.size
+            else:
+                field_val, offset = deserialize_lazy_from(data, offset)
+                setattr(obj, plan, field_val)
+        obj._lazy_fields = lazy_fields
+        return obj, offset
+
+    @classmethod
+    def lazy_model(cls) -> type:
+        """The subclass of `cls` that `deserialize_lazy_from` makes, which
+            keeps the runs of fixed-width fields not read yet in
+            `_lazy_fields`, and deserializes one when any of its fields is
+            first read (or set); so `cls` itself pays nothing for it.
+        """
+        lazy_model = cls.__dict__.get('_lazy_model', None)
+        if lazy_model is not None:
+            return lazy_model
+
+        def __impl_getattr__(self, name: str):
+            # only called for attributes not set yet.
+            if name == '_lazy_fields':
+                raise AttributeError(name)
+            run = self._lazy_fields.get(name, None)
+            if run is None:
+                raise AttributeError(name)
+            data, offset, layout, plan = run
+            Model.unpack_fields(self,
+                                plan,
+                                layout.unpack_from(data, offset),
+                                0)
+            for private_name, _, _, _ in plan:
+                self._lazy_fields.pop(private_name, None)
+            return getattr(self, name)
+
+        class __impl_lazy_model__(cls):
+            if cls._slotted:
+                __slots__ = ('_lazy_fields',)
+
+            __getattr__ = __impl_getattr__
+
+        for name, private_name in cls._private_names.items():
+
+            def __impl_setter__(self,
+                                val,
+                                private_name: str = private_name):
+                if private_name in self._lazy_fields:
+                    # deserialize its run first, else reading the rest of
+                    # the run later would undo this.
+                    getattr(self, private_name)
+                setattr(self, private_name, val)
+                return self
+
+            setattr(__impl_lazy_model__, f'set_{name!s}', __impl_setter__)
+
+            def __impl_getter__(self, private_name: str = private_name):
+                return getattr(self, private_name, None)
+
+            setattr(__impl_lazy_model__, f'get_{name!s}', __impl_getter__)
+
+        __impl_lazy_model__.__name__ = cls.__name__
+        __impl_lazy_model__.__qualname__ = cls.__qualname__
+        cls._lazy_model = __impl_lazy_model__
+        return __impl_lazy_model__
+
+    @classmethod
+    def skip_from(cls, data: bytes, offset: int = 0) -> int:
+        """The offset just after the `Model` at `offset` in `data`, without
+            deserializing its fields (where possible).
+        """
+        model = cls.peek_model(data, offset)
+        if model is not cls:
+            return model.skip_from(data, offset)
+        if cls._struct is not None:
+            return offset + cls._struct.size
+
+        for layout, _, _, skip_from in cls._lazy_codec:
+            offset = (offset + layout.size
+                      if layout is not None else
+                      skip_from(data, offset))
+        return offset
 
     def serialize(self) -> bytes:
-        """Serialize a `Model` according to its `order_of_fields` and
-            `field_serializers`.
+        """Serialize a `Model` according to its compiled `codec`, i.e. its
+            `order_of_fields` and `field_serializers`.
 
             Can cause some headaches on optional arguments, so assume there
             are no `None` values.
         """
-        return b''.join(self._field_serializers[name](getattr(self,
-                                                              f'get_{name!s}',
-                                                              lambda:
-                                                              None)())
-                        for name in self._order_of_fields)
+        return b''.join(layout.pack(*Model.pack_fields(self, plan, []))
+                        if layout is not None else
+                        serialize(getattr(self, plan, None))
+                        for layout, plan, serialize, _ in self._codec)
+
+    @staticmethod
+    def pack_fields(obj, plan: List[tuple], values: list) -> list:
+        """Append the values of the fixed-width fields in `plan` (flattening
+            nested `Model`s) onto `values`, ready for `struct.pack`.
+        """
+        for private_name, pack, _, nested in plan:
+            val = getattr(obj, private_name, None)
+            if nested is not None:
+                Model.pack_fields(val, nested[1], values)
+            else:
+                values.append(val if pack is None else pack(val))
+        return values
+
+    @staticmethod
+    def unpack_fields(obj, plan: List[tuple], values: tuple, i: int) -> int:
+        """Set the fixed-width fields in `plan` (building nested `Model`s)
+            from `values[i:]`, as returned by `struct.unpack`.
+
+            Returns: the index into `values` after the last one used.
+        """
+        for private_name, _, unpack, nested in plan:
+            if nested is not None:
+                model, nested_plan = nested
+                val = model.__new__(model)
+                i = Model.unpack_fields(val, nested_plan, values, i)
+            else:
+                val = values[i] if unpack is None else unpack(values[i])
+                i += 1
+            setattr(obj, private_name, val)
+        return i
 
     @classmethod
     def from_grpc_model(model, grpc_obj):
@@ -209,8 +476,13 @@ class Model(object):
                           field_serializers: Dict[str, Callable] = {},
                           fields_list_nested: Dict[str, type] = {},
                           order_of_fields: List[str] = [],
+                          slots: bool = False,
                           **fields: Dict[str, type]) -> type:
         """Create a new `Model` subclass with the given class attributes.
+
+            If `slots`, then the fields are kept in `__slots__` (so instances
+            are smaller and faster to build); subclasses should then also set
+            `__slots__ = ()`, or they get a `__dict__` back.
         """
 
         # apparently we might accidentally make mutations to the default
@@ -256,6 +528,11 @@ class Model(object):
             field_serializers[name] = serialize
 
         class __impl_model__(Model):
+            if slots:
+                __slots__ = tuple(f'_{name!s}' for name in fields)
+
+            _slotted = slots
+
             # copy is likely safest here...
             _fields = {k: v for k, v in fields.items()}
 
@@ -270,7 +547,7 @@ class Model(object):
 
             _fields_list_nested = {k: v for k, v in fields_list_nested.items()}
 
-        return __impl_model__.add_getters_setters()
+        return __impl_model__.add_getters_setters().compile_codec()
 
     @classmethod
     def add_getters_setters(model):
@@ -282,45 +559,44 @@ class Model(object):
                 raise ValueError(f'Field \'{name!s}\' with value '
                                  f'\'{value!r}\' which is not a `type`.')
 
-            # note: you do NOT want to put `private_name` within any of the
-            #       implementations that will be `setattr`ed, since then
-            #       `private_name` the variable will be bound to the function.
-            #       Another way would be to explicitly `del` it, but uh, that's
-            #       not very pythonic...
-            #
-            #       For some stupid, hacky reason the default works.
-            #       I guess since it puts it in the function's `__defaults__`
-            #       attribute...
             private_name = f'_{name!s}'
 
-            # the getter we'll add to `model`.
-            def __impl_setter__(self: model,
-                                val: Optional[value],
-                                private_name: str = private_name):
-                setattr(self, private_name, val)
-                return self
-
-            setattr(model, f'set_{name!s}', __impl_setter__)
+            # these are generated rather than closures over `private_name`,
+            # so they read and write the attribute (i.e. its slot, if the
+            # model is slotted) directly, not through `getattr`/`setattr`
+            # by name; the same way `dataclasses` makes its `__init__`.
+            # this does mean a field must be set (e.g. by `__init__`)
+            # before it is got.
+            impls = {}
+            exec(f'def __impl_setter__(self, val):\n'
+                 f'    self.{private_name!s} = val\n'
+                 f'    return self\n'
+                 f'def __impl_getter__(self):\n'
+                 f'    return self.{private_name!s}\n',
+                 impls)
 
             # the setter we'll add to `model`.
-            def __impl_getter__(self: model,
-                                private_name: str = private_name):
-                return getattr(self, private_name, None)
+            setattr(model, f'set_{name!s}', impls['__impl_setter__'])
+
+            # the getter we'll add to `model`.
+            setattr(model, f'get_{name!s}', impls['__impl_getter__'])
 
-            setattr(model, f'get_{name!s}', __impl_getter__)
+        model._private_names = {name: f'_{name!s}' for name in model._fields}
 
         # the `__init__` we'll add to `model`.
         # this might get weird with inheritence, but as long as the inherited
         # call `add_getters_setters`, then we should be good.
         def __impl_init__(self, **kwargs) -> model:
-            for name in self._fields:
+            field_defaults = self._field_defaults
+            for name, private_name in self._private_names.items():
                 if name in kwargs:
-                    getattr(self, f'set_{name!s}', lambda _: _)(kwargs
-                                                                [name])
+                    val = kwargs[name]
                 else:
-                    setattr(self,
-                            f'_{name!s}',
-                            self._field_defaults.get(name, None))
+                    val = field_defaults.get(name, None)
+                    # so a `list` default isn't shared by every instance.
+                    if type(val) is list:
+                        val = list(val)
+                setattr(self, private_name, val)
 
         setattr(model, '__init__', __impl_init__)
 
@@ -343,6 +619,81 @@ class Model(object):
                 model._order_of_fields.append(name)
         return model
 
+    @classmethod
+    def fixed_width_field(model, name: str) -> Optional[tuple]:
+        """The `struct` format and `plan` entry of the field `name`, if it is
+            fixed-width, otherwise `None`.
+
+            A field is fixed-width if its (de)serializers are marked by
+            `fixed_width`, or if it is a `Model` with default (de)serializers
+            whose fields are all fixed-width.
+        """
+        t = model._fields[name]
+        serializer = model._field_serializers[name]
+        deserializer = model._field_deserializers[name]
+        private_name = f'_{name!s}'
+
+        if (issubclass(t, Model) and
+                t._struct is not None and
+                getattr(serializer, 'nested_model', None) is t and
+                deserializer == t.deserialize and
+                t.deserialize.__func__ is Model.deserialize.__func__ and
+                t.deserialize_from.__func__ is
+                Model.deserialize_from.__func__ and
+                t.peek_model.__func__ is Model.peek_model.__func__ and
+                t.serialize is Model.serialize):
+            return (t._struct.format[1:],
+                    (private_name, None, None, (t, t._codec[0][1])))
+
+        serializer_layout = getattr(serializer, 'fixed_width', None)
+        deserializer_layout = getattr(deserializer, 'fixed_width', None)
+        if (serializer_layout is None or deserializer_layout is None or
+                serializer_layout[0] != deserializer_layout[0]):
+            return None
+        return (serializer_layout[0],
+                (private_name, serializer_layout[1], deserializer_layout[2],
+                 None))
+
+    @classmethod
+    def compile_codec(model):
+        """Compile the `order_of_fields` into runs of fixed-width fields, so
+            that each run is (de)serialized in one pass by a precomputed
+            `struct.Struct`, rather than field by field.
+        """
+        codec = []
+        fmt, plan = '', []
+        for name in model._order_of_fields:
+            field = model.fixed_width_field(name)
+            if field is not None:
+                fmt += field[0]
+                plan.append(field[1])
+                continue
+            if len(plan) > 0:
+                codec.append((struct.Struct('<' + fmt), plan, None, None))
+                fmt, plan = '', []
+            codec.append((None,
+                          f'_{name!s}',
+                          model._field_serializers[name],
+                          Model.field_deserializer_from(
+                              model._field_deserializers[name],
+                              model._field_serializers[name])))
+        if len(plan) > 0:
+            codec.append((struct.Struct('<' + fmt), plan, None, None))
+
+        model._codec = codec
+        model._lazy_codec = [
+            (layout, plan, None, None)
+            if layout is not None else
+            (None,
+             plan,
+             Model.field_lazy_deserializer_from(deserialize_from),
+             Model.field_skipper_from(deserialize_from))
+            for layout, plan, _, deserialize_from in codec]
+        model._struct = (codec[0][0]
+                         if len(codec) == 1 and codec[0][0] is not None else
+                         None)
+        return model
+
     @classmethod
     def add_fields(cls,
                    field_defaults: Dict[str, object] = {},
@@ -350,9 +701,11 @@ class Model(object):
                    field_serializers: Dict[str, Callable] = {},
                    fields_list_nested: Dict[str, type] = {},
                    order_of_fields: List[str] = [],
+                   slots: Optional[bool] = None,
                    **new_fields: Dict[str, type]) -> type:
         """The same as `model_with_fields`, but using the initial state
             of whatever `Model` subclass it's called from, adding on.
+            It is `slots` if that `Model` is, unless given.
         """
         return Model.model_with_fields(
             field_defaults=dict(list(getattr(cls,
@@ -372,6 +725,7 @@ class Model(object):
                                                  {}).items()) +
                                     list(fields_list_nested.items())),
             order_of_fields=order_of_fields,
+            slots=cls._slotted if slots is None else slots,
             **dict(list(getattr(cls, '_fields', {}).items()) +
                    list(new_fields.items()))).add_getters_setters()
 
@@ -382,9 +736,11 @@ class Model(object):
                     field_serializers: Dict[str, Callable] = {},
                     fields_list_nested: Dict[str, type] = {},
                     order_of_fields: List[str] = [],
+                    slots: Optional[bool] = None,
                     **rm_fields: Dict[str, type]) -> type:
         """The same as `model_with_fields`, but using the initial state
             of whatever `Model` subclass it's called from, removing from.
+            It is `slots` if that `Model` is, unless given.
         """
         for fname in rm_fields:
             if fname not in cls._fields:
@@ -408,6 +764,7 @@ class Model(object):
                                                  {}).items()) +
                                     list(fields_list_nested.items())),
             order_of_fields=order_of_fields,
+            slots=cls._slotted if slots is None else slots,
             **{n: t for n, t in cls._fields.items()
                if n not in rm_fields}).add_getters_setters()
 
@@ -1,8 +1,16 @@
 # unit_tests.py
 
 from itertools import permutations
-from synfony.enums import EventCode, OperationCode
-from synfony.models import BaseRequest, HeartbeatRequest, IdentityRequest
+from math import ceil, log
+from pathlib import Path
+from random import Random
+from socket import socketpair
+from synfony.async_machine import AsyncMachine
+from synfony.config import Config
+from synfony.machine import Machine
+from synfony.enums import ConnectionState, EventCode, OperationCode
+from synfony.models import BaseRequest, DecisionRequest, EventRequest
+from synfony.models import GossipRequest, HeartbeatRequest, IdentityRequest
 from synfony.models import ChannelState, MachineAddress
 from synfony.models import BaseEvent, \
                            NoneEvent, \
@@ -10,9 +18,27 @@ from synfony.models import BaseEvent, \
                            PlayEvent, \
                            SeekEvent, \
                            VolumeEvent
+from synfony.peers import Backoff, ClockSync, FailureDetector, GossipView
+from synfony.peers import LeaderElection, PeerSender, PeerTable
+from synfony.peers import ReactiveState, ReconnectManager, RoundScheduler
+from synfony.peers import VoteSlots
+from synfony.peers import gossip_neighbors
+from synfony.serialization import LazyList
+from synfony.sockets import DATAGRAM_HEADER, FrameDecoder, FramedTCPSockets
+from synfony.sockets import MulticastUDPSockets
+from synfony.streamer import ChunkCache, LocalMusicStreamer
+from synfony.ui import EventQueue
 from synfony.util import Model
+from threading import Event, Thread
+from time import monotonic, sleep
+from timeit import repeat
+from types import SimpleNamespace
 
+import asyncio
+import os
+import pygame
 import pytest
+import synfony.streamer
 
 
 # MARK: - `Model` tests, i.e. deserializations are "good"
@@ -56,6 +82,73 @@ def test_model_get_set(args):
     assert repr(obj) == f'field: {val!r}'  # str/repr works
 
 
+@pytest.mark.parametrize(
+    'args',
+    [(bool, True),
+     (float, 2),
+     (int, 3),
+     (str, 'a')]
+)
+def test_model_slots(args):
+    t, val = args
+
+    class TestModel(
+        Model.model_with_fields(
+            field=t,
+            slots=True
+        )
+    ):
+        __slots__ = ()
+
+    obj = TestModel()
+    assert not hasattr(obj, '__dict__')    # slotted
+    assert obj.get_field() is None         # default
+
+    assert obj.set_field(val) is obj
+    assert obj.get_field() == val          # set works
+    assert obj == TestModel(field=val)     # eq works
+
+    # and stays slotted when extended
+    ExtendedTestModel = TestModel.add_fields(other=t)
+    assert ExtendedTestModel._slotted
+
+    assert TestModel.deserialize(obj.serialize()) == obj
+    assert TestModel.deserialize_lazy(obj.serialize()) == obj
+
+
+def test_model_get_set_speed():
+    class SlottedModel(
+        Model.model_with_fields(
+            field=float,
+            slots=True
+        )
+    ):
+        __slots__ = ()
+
+    # the getters and setters as they were, on a `__dict__`
+    class DictModel(object):
+        def __init__(self):
+            self._field = 1.0
+
+        def get_field(self, private_name='_field'):
+            return getattr(self, private_name, None)
+
+        def set_field(self, val, private_name='_field'):
+            setattr(self, private_name, val)
+            return self
+
+    def best_of(obj):
+        return (min(repeat(obj.get_field, number=20000, repeat=5)),
+                min(repeat(lambda: obj.set_field(2.0),
+                           number=20000,
+                           repeat=5)))
+
+    get_time, set_time = best_of(SlottedModel(field=1.0))
+    dict_get_time, dict_set_time = best_of(DictModel())
+    assert get_time <= dict_get_time
+    assert set_time <= dict_set_time
+
+
 @pytest.mark.parametrize(
     'args',
     [(bool, True),
@@ -150,9 +243,62 @@ def test_model_list(args):
     assert TestModel.deserialize(obj.serialize()) == obj
 
 
+@pytest.mark.parametrize(
+    'args',
+    [(bool, True),
+     (float, 2),
+     (int, 3),
+     (str, 'a')]
+)
+def test_model_deserialize_from(args):
+    t, val = args
+
+    class TestModel(
+        Model.model_with_fields(
+            field=list,
+            fields_list_nested=dict(
+                field=t
+            )
+        )
+    ):
+        pass
+
+    # the longest list the wire format allows
+    obj = TestModel(field=[val] * Config.LIST_MAX_LEN)
+    data = obj.serialize()
+
+    # decoding from an offset returns where it stopped
+    prefix = b'\x00' * 3
+    decoded, offset = TestModel.deserialize_from(prefix + data + prefix, 3)
+    assert decoded == obj
+    assert offset == len(prefix) + len(data)
+
+
 # MARK: - `BaseEvent` tests
 
 
+@pytest.mark.parametrize(
+    'event_code',
+    list(EventCode)
+)
+def test_event_compiled_codec(event_code):
+    event = new_event(event_code, 1, 2.5, True, 0.5)
+
+    # events are entirely fixed-width, so should be one `struct.Struct`
+    assert type(event)._struct is not None
+
+    # and the wire format matches going field by field
+    data = event.serialize()
+    assert data == b''.join(
+        event._field_serializers[name](getattr(event, f'get_{name!s}')())
+        for name in event._order_of_fields
+    )
+    assert len(data) == type(event)._struct.size
+
+    assert BaseEvent.deserialize(data) == event
+    assert type(BaseEvent.deserialize(data)) is type(event)
+
+
 # MARK: - `ChannelState` tests
 
 
@@ -313,10 +459,1024 @@ def test_choice(test_case):
             test_case.get_output())
 
 
-# MARK: - `BaseRequest` tests
+def test_batch_choice():
+    rng = Random(262)
+    events = []
+    for _ in range(400):
+        event = new_event(rng.choice(list(EventCode)),
+                          rng.randint(0, 3),
+                          rng.randint(0, 3),
+                          rng.random() < 0.5,
+                          rng.choice([0.25, 0.5, 0.75]))
+        event.get_channel_state().set_idx(rng.randrange(32))
+        events.append(event)
+
+    channel_states = ChannelState.batch_choice_func(events)
+    assert [channel_state.get_idx() for channel_state in channel_states] == \
+        sorted({event.get_channel_state().get_idx() for event in events})
+    assert channel_states == [
+        ChannelState.choice_func([
+            event for event in events
+            if event.get_channel_state().get_idx() == channel_state.get_idx()
+        ])
+        for channel_state in channel_states
+    ]
+    assert ChannelState.batch_choice_func([]) == []
+
+
+def test_heartbeat_deserialize_lazy():
+    request = HeartbeatRequest(
+        channel_events_states=[new_event(event_code, 1, 2, True, 0.5)
+                               for event_code in EventCode],
+        machine_addresses=[MachineAddress(host='localhost',
+                                          idx=i,
+                                          port=10000 * (i + 1),
+                                          status=True)
+                           for i in range(3)],
+        sent_timestamp=3.5
+    )
+    data = request.serialize()
+
+    lazy = BaseRequest.deserialize_lazy(data)
+    assert type(lazy) is HeartbeatRequest.lazy_model()
+    assert isinstance(lazy, HeartbeatRequest)
+
+    # only the lazy subclass deserializes on read
+    assert not hasattr(HeartbeatRequest, '__getattr__')
+    assert HeartbeatRequest.lazy_model() is HeartbeatRequest.lazy_model()
+
+    # nothing is deserialized until read
+    events = lazy.get_channel_events_states()
+    assert len(events) == len(EventCode)
+    assert all(item is LazyList._UNREAD for item in events._items)
+
+    assert lazy.get_sent_timestamp() == 3.5
+    assert isinstance(events[-1], VolumeEvent)
+    assert events._items[0] is LazyList._UNREAD
+
+    # read items are kept, so mutations stick
+    events[0].get_channel_state().set_timestamp(5)
+    assert events[0].get_channel_state().get_timestamp() == 5
+    events[0].get_channel_state().set_timestamp(2)
+
+    assert lazy == request
+    assert lazy.serialize() == data
+
+
+def test_heartbeat_set_before_read_lazy():
+    data = HeartbeatRequest(channel_events_states=[],
+                            machine_addresses=[],
+                            sent_timestamp=1.0,
+                            membership_version=3).serialize()
+
+    lazy = HeartbeatRequest.deserialize_lazy(data)
+    lazy.set_sent_timestamp(5.0)
+    assert lazy.get_membership_version() == 3
+    assert lazy.get_sent_timestamp() == 5.0
+
+    lazy = HeartbeatRequest.deserialize_lazy(data)
+    lazy.set_membership_version(9)
+    request = HeartbeatRequest.deserialize(lazy.serialize())
+    assert request.get_membership_version() == 9
+    assert request.get_sent_timestamp() == 1.0
+
+
+def test_echo_field_defaults():
+    for model in [HeartbeatRequest, DecisionRequest]:
+        request = model()
+        request.get_echo_idxes().append(1)
+        request.get_echo_sent_timestamps().append(1.0)
+        assert model().get_echo_idxes() == []
+        assert model().get_echo_sent_timestamps() == []
+
+
+def test_decision_peek_model():
+    request = DecisionRequest(
+        channel_states=[ChannelState(idx=i,
+                                     last_timestamp=1,
+                                     timestamp=2,
+                                     playing=True,
+                                     volume=0.5)
+                        for i in range(2)],
+        machine_addresses=[MachineAddress(host='localhost',
+                                          idx=0,
+                                          port=10000,
+                                          status=True)],
+        sent_timestamp=3.5
+    )
+    data = request.serialize()
+    assert BaseRequest.peek_operation_code(data) == OperationCode.DECISION
+    assert type(BaseRequest.deserialize(data)) is DecisionRequest
+    assert BaseRequest.deserialize(data) == request
+
+
+# MARK: - framing tests
+
+
+def test_frame_decoder():
+    messages = [b'', b'a', b'bc' * 700, b'def']
+    stream = b''.join(FrameDecoder.encode(message) for message in messages)
+
+    # however the stream is split up, the same frames come out
+    for step in [1, 3, len(stream)]:
+        decoder = FrameDecoder()
+        frames = [frame
+                  for i in range(0, len(stream), step)
+                  for frame in decoder.frames(stream[i:i + step])]
+        assert frames == messages
+        assert decoder.next_frame() is None
+
+
+def test_framed_sockets_recv():
+    a, b = socketpair()
+    try:
+        # merged into one `recv` by TCP, but still separate frames
+        FramedTCPSockets.sendall(a, b'first')
+        FramedTCPSockets.sendall(a, b'second')
+        assert FramedTCPSockets.recv(b) == b'first'
+        assert FramedTCPSockets.recv(b) == b'second'
+
+        FramedTCPSockets.close(a)
+        assert FramedTCPSockets.recv(b) == b''
+    finally:
+        FramedTCPSockets.close(b)
+
+
+def test_multicast_sockets_latest_wins(monkeypatch):
+    monkeypatch.setattr(Config, 'MULTICAST_LOOPBACK', True)
+    group = MachineAddress(host='239.255.42.98', idx=1, port=10299)
+    r = MulticastUDPSockets.start_socket(machine_address=group,
+                                         timeout=Config.TIMEOUT,
+                                         bind=True)
+    s = MulticastUDPSockets.start_socket(machine_address=group,
+                                         connect=True)
+    try:
+        MulticastUDPSockets.sendall(s, b'first')
+        MulticastUDPSockets.sendall(s, b'second')
+        assert MulticastUDPSockets.recv_from(r) == (1, b'first')
+        assert MulticastUDPSockets.recv(r) == b'second'
+
+        # so a late (i.e. reordered) one from that machine is dropped
+        s.send(DATAGRAM_HEADER.pack(1, 0) + b'late')
+        MulticastUDPSockets.sendall(s, b'third')
+        assert MulticastUDPSockets.recv(r) == b'third'
+    finally:
+        MulticastUDPSockets.close(s)
+        MulticastUDPSockets.close(r)
+
+
+# MARK: - `PeerSender` tests
+
+
+def test_peer_sender_latest_wins():
+    class SlowSockets:
+        def __init__(self):
+            self.sent = []
+            self.taken = Event()
+            self.unblocked = Event()
+
+        def sendall(self, s, data):
+            self.taken.set()
+            assert self.unblocked.wait(Config.TIMEOUT)
+            self.sent.append(data)
+
+    statuses = []
+    both_sent = Event()
+
+    def on_status(i, status):
+        statuses.append(status)
+        if len(statuses) == 2:
+            both_sent.set()
+
+    slow_sockets = SlowSockets()
+    sender = PeerSender(slow_sockets, object(), 1,
+                        on_status=on_status,
+                        max_len=1)
+    try:
+        # the first is taken by the (stuck) sender, then each next one
+        # supersedes the last one queued.
+        sender.send(b'first')
+        assert slow_sockets.taken.wait(Config.TIMEOUT)
+        [sender.send(data) for data in [b'second', b'third', b'fourth']]
+        assert sender.stats()['dropped'] == 2
+
+        slow_sockets.unblocked.set()
+        assert both_sent.wait(Config.TIMEOUT)
+        assert slow_sockets.sent == [b'first', b'fourth']
+        assert statuses == [True, True]
+        assert sender.stats()['sent'] == 2
+        assert sender.stats()['max_latency'] > 0
+    finally:
+        slow_sockets.unblocked.set()
+        sender.stop()
+
+
+def test_vote_slots_latest_wins():
+    vote_slots = VoteSlots(2)
+    assert not vote_slots.wait_full(0)
+
+    vote_slots.put(0, 'old')
+    vote_slots.put(0, 'new')
+    assert not vote_slots.full()
+    vote_slots.put(1, 'only')
+    assert vote_slots.wait_full(0)
+
+    slots = vote_slots.take()
+    assert [slot[0] for slot in slots] == ['new', 'only']
+    assert [slot[2] for slot in slots] == [0, 0]
+    assert vote_slots.get_round() == 1
+
+    vote_slots.put(1, 'next')
+    slots = vote_slots.take()
+    assert slots[0] is None
+    assert slots[1][0] == 'next' and slots[1][2] == 1
+
+
+def test_vote_slots_wake_on_last_vote():
+    a, b = socketpair()
+    vote_slots = VoteSlots(2)
+    vote_slots.put(0, 'mine')
+    peer_table = PeerTable([MachineAddress(idx=0, status=True),
+                            MachineAddress(idx=1, status=True)])
+    thread = Thread(target=Machine.listen_client,
+                    args=[1,
+                          b,
+                          lambda i, data: Machine.receive_request(
+                              i, data, vote_slots, VoteSlots(2),
+                              FailureDetector(2)),
+                          peer_table])
+    thread.start()
+
+    def send_last_vote():
+        sleep(0.05)
+        FramedTCPSockets.sendall(
+            a,
+            HeartbeatRequest(channel_events_states=[],
+                             machine_addresses=[],
+                             sent_timestamp=1.0).serialize()
+        )
+
+    sender = Thread(target=send_last_vote)
+    try:
+        # phase 2 of the `metronome` ends once the last vote is in, rather
+        # than at the timeout.
+        start_t = monotonic()
+        sender.start()
+        assert vote_slots.wait_full(Config.TIMEOUT)
+        assert 0.04 <= monotonic() - start_t < Config.TIMEOUT / 4
+    finally:
+        sender.join(Config.TIMEOUT)
+        FramedTCPSockets.close(a)
+        thread.join(Config.TIMEOUT)
+
+
+def test_peer_table():
+    peer_table = PeerTable([MachineAddress(idx=0, status=True)])
+    peer_table.add(MachineAddress(idx=2, status=False))
+    assert len(peer_table) == 3
+    assert peer_table.get_machine_addresses()[1] is None
+
+    # only marks it down if it was up
+    peer_table.set_status(2, True, only_if_up=True)
+    assert not peer_table.get_status(2)
+    peer_table.set_status(0, False, only_if_up=True)
+    assert not peer_table.get_status(0)
+    peer_table.set_status(1, True)
+    assert not peer_table.get_status(1)
+
+    assert peer_table.lock_stats()['acquisitions'] == 8
+
+
+def test_peer_table_version():
+    machine_addresses = [MachineAddress(host='localhost',
+                                        idx=i,
+                                        port=10000 * (i + 1),
+                                        status=True)
+                         for i in range(2)]
+    peer_table = PeerTable(list(machine_addresses))
+    version = peer_table.get_version()
+    assert version == PeerTable.version_of(machine_addresses)
+
+    # the first is due, then not until the membership changes
+    assert peer_table.take_snapshot_due()
+    assert not peer_table.take_snapshot_due()
+    peer_table.set_status(1, False)
+    assert peer_table.get_version() == version
+    assert not peer_table.take_snapshot_due()
+
+    # only the ones I didn't know of are added (as down)
+    joined = MachineAddress(host='localhost', idx=3, port=40000, status=True)
+    assert not peer_table.merge(machine_addresses)
+    assert peer_table.merge(machine_addresses + [joined])
+    assert peer_table.get_version() != version
+    assert not peer_table.get_status(3)
+    assert peer_table.take_snapshot_due()
+
+    peer_table.request_snapshot()
+    assert peer_table.take_snapshot_due()
+    assert not peer_table.take_snapshot_due()
+
+
+def test_heartbeat_membership_delta():
+    machine_addresses = [MachineAddress(host='localhost',
+                                        idx=i,
+                                        port=10000 * (i + 1),
+                                        status=True)
+                         for i in range(16)]
+    ui_manager = SimpleNamespace(event_queue=EventQueue(), streamers=[])
+    full = Machine.make_heartbeat(machine_addresses, ui_manager)
+    delta = Machine.make_heartbeat(machine_addresses, ui_manager, full=False)
+
+    assert (full.get_membership_version() ==
+            delta.get_membership_version() ==
+            PeerTable.version_of(machine_addresses))
+    assert delta.get_machine_addresses() == []
+    assert len(delta.serialize()) < len(full.serialize()) // 4
+    assert HeartbeatRequest.deserialize(delta.serialize()) == delta
+
+    # with everyone heard from (and echoed back), only a few are echoed
+    clock_sync = ClockSync(16, 0)
+    for i in range(1, 16):
+        clock_sync.received(i, 100.0, [0], [99.0], [99.0], t=100.1)
+    assert len(clock_sync.rtts()) == 15
+    deltas = [Machine.make_heartbeat(machine_addresses,
+                                     ui_manager,
+                                     clock_sync,
+                                     full=False)
+              for _ in range(8)]
+    assert all(len(delta.get_echo_idxes()) == clock_sync.max_echoes
+               for delta in deltas[:7])
+    # i.e. a few dozen bytes
+    assert max(len(delta.serialize()) for delta in deltas) <= 64
+    # and each once, until heard from again
+    assert sorted(i for delta in deltas for i in delta.get_echo_idxes()) == \
+        list(range(1, 16))
+    assert Machine.make_heartbeat(machine_addresses,
+                                  ui_manager,
+                                  clock_sync,
+                                  echo_to=[1]).get_echo_idxes() == []
+
+
+def test_failure_detector():
+    failure_detector = FailureDetector(2, threshold=4.0)
+    t = 100.0
+    for _ in range(10):
+        t += Config.HANDSHAKE_INTERVAL
+        failure_detector.heartbeat(1, t)
+    assert not failure_detector.is_suspected(1, t + Config.HANDSHAKE_INTERVAL)
+
+    t += 20 * Config.HANDSHAKE_INTERVAL
+    assert failure_detector.is_suspected(1, t)
+    assert failure_detector.get_trusted(0, t) == [0]
+
+    # trusted again once heard from
+    failure_detector.heartbeat(1, t)
+    assert failure_detector.get_trusted(0, t) == [0, 1]
+
+
+def test_clock_sync():
+    # 1's clock is 5s ahead of 0's, and it's 10ms each way (or 50ms, once).
+    clock_syncs = [ClockSync(2, 0), ClockSync(2, 1)]
+    t = 100.0
+    for i, delay in enumerate([0.01, 0.05, 0.01, 0.01, 0.01]):
+        sender, receiver = i % 2, (i + 1) % 2
+        sent_t = t + 5.0 * sender
+        t += delay
+        clock_syncs[receiver].received(sender,
+                                       sent_t,
+                                       *clock_syncs[sender].get_echoes(),
+                                       t=t + 5.0 * receiver)
+        t += 0.1
+
+    offset, rtt = clock_syncs[0].estimate(1)
+    assert offset == pytest.approx(5.0)
+    assert rtt == pytest.approx(0.02)
+    assert clock_syncs[0].to_local(1, 105.0) == pytest.approx(100.0)
+    assert clock_syncs[1].estimate(0)[0] == pytest.approx(-5.0)
+    assert set(clock_syncs[0].stats()) == {1}
+
+
+def test_round_scheduler():
+    scheduler = RoundScheduler(min_interval=0.1, max_interval=1, backoff=2)
+    [scheduler.observe(False) for _ in range(3)]
+    assert scheduler.interval == pytest.approx(0.8)
+    scheduler.observe(False)
+    assert scheduler.interval == 1
+    scheduler.observe(True)
+    assert scheduler.interval == pytest.approx(0.1)
+
+    rtts = [0.001 * i for i in range(1, 101)]
+    assert RoundScheduler.percentile(rtts, 0.99) == pytest.approx(0.099)
+    assert scheduler.heartbeat_timeout(rtts) == pytest.approx(min(
+        Config.RTT_TIMEOUT_FACTOR * 0.099, 0.1))
+    assert scheduler.heartbeat_timeout([0.0]) == Config.HEARTBEAT_TIMEOUT_MIN
+
+    scheduler.wake()
+    assert scheduler.sleep(Config.TIMEOUT)
+    assert not scheduler.sleep(0)
+
+
+def test_chunk_cache():
+    loads = []
+    decoded = Event()
+
+    def load(chunk):
+        loads.append(chunk)
+        if chunk == 3:
+            decoded.set()
+        return f'sound-{chunk!s}'
+
+    chunk_cache = ChunkCache(load, capacity=3)
+    assert chunk_cache.get(1) == 'sound-1'
+    assert chunk_cache.get(1) == 'sound-1'
+    assert (chunk_cache.hits, chunk_cache.misses) == (1, 1)
+
+    # decoded in the background, so getting them doesn't
+    chunk_cache.prefetch([2, 3])
+    assert decoded.wait(1)
+    assert chunk_cache.get(3) == 'sound-3'
+    assert chunk_cache.get(2) == 'sound-2'
+    assert loads == [1, 2, 3]
+
+    # the least recently used is dropped
+    chunk_cache.get(4)
+    assert 1 not in chunk_cache
+    assert all(chunk in chunk_cache for chunk in [2, 3, 4])
+
+
+def test_resample():
+    numpy = pytest.importorskip('numpy')
+    # a stereo ramp, one channel going up and the other down
+    frames = numpy.stack([numpy.arange(1000), -numpy.arange(1000)],
+                         axis=1).astype(numpy.int16)
+
+    resampled = numpy.frombuffer(
+        LocalMusicStreamer.resample(frames.tobytes(), 1.02, -16, 2),
+        dtype=numpy.int16
+    ).reshape(-1, 2)
+    assert len(resampled) == round(1000 / 1.02)
+    assert resampled[0].tolist() == [0, 0]
+    assert resampled[-1].tolist() == [999, -999]
+    assert (numpy.diff(resampled[:, 0]) >= 0).all()
+
+    assert LocalMusicStreamer.resample(frames.tobytes(), 1.0, -16, 2) == \
+        frames.tobytes()
+
+
+def test_backoff():
+    backoff = Backoff(base=1, cap=8)
+    delays = [backoff.next_delay() for _ in range(6)]
+    assert all(cap / 2 <= delay <= cap
+               for delay, cap in zip(delays, [1, 2, 4, 8, 8, 8]))
+
+    backoff.reset()
+    assert backoff.next_delay() <= 1
+
+
+def test_reconnect_manager():
+    s = FramedTCPSockets.start_socket(
+        machine_address=MachineAddress(host='127.0.0.1', port=0),
+        timeout=Config.TIMEOUT,
+        bind=True
+    )
+    host, port = s.getsockname()
+    connected = []
+    reconnects = ReconnectManager(
+        FramedTCPSockets,
+        on_connect=lambda key, c: connected.append((key, c))
+    )
+    try:
+        reconnects.connect('peer', MachineAddress(host=host, port=port))
+        first = reconnects.wait_connected('peer', Config.TIMEOUT)
+        assert first is not None
+        assert reconnects.get_state('peer') == ConnectionState.CONNECTED
+        FramedTCPSockets.close(s.accept()[0])
+
+        # once it's reported down, it's replaced (but only once)
+        assert reconnects.disconnected('peer', first)
+        assert not reconnects.disconnected('peer', first)
+        FramedTCPSockets.close(s.accept()[0])
+        second = reconnects.wait_connected('peer', Config.TIMEOUT)
+        assert second is not None and second is not first
+        assert connected == [('peer', first), ('peer', second)]
+
+        reconnects.remove('peer')
+        assert reconnects.get_state('peer') == ConnectionState.CLOSED
+    finally:
+        reconnects.stop()
+        FramedTCPSockets.close(s)
+
+
+def test_listen_client_ends_on_eof():
+    a, b = socketpair()
+    vote_slots = VoteSlots(2)
+    peer_table = PeerTable([MachineAddress(idx=0, status=True),
+                            MachineAddress(idx=1, status=True)])
+    thread = Thread(target=Machine.listen_client,
+                    args=[1,
+                          b,
+                          lambda i, data: Machine.receive_request(
+                              i, data, vote_slots, VoteSlots(2),
+                              FailureDetector(2)),
+                          peer_table])
+    thread.start()
+
+    request = HeartbeatRequest(channel_events_states=[],
+                               machine_addresses=[],
+                               sent_timestamp=1.0)
+    FramedTCPSockets.sendall(a, request.serialize())
+    FramedTCPSockets.close(a)
+
+    thread.join(Config.TIMEOUT)
+    assert not thread.is_alive()
+    assert vote_slots.take()[1][0] == request
+    assert not peer_table.get_status(1)
+
+
+def test_machine_stats(capsys, monkeypatch):
+    peer_table = PeerTable([MachineAddress(idx=0, status=True)])
+    vote_slots = VoteSlots(1)
+    clock_sync = ClockSync(2, 0)
+    sender = SimpleNamespace(stats=lambda: dict(sent=1, dropped=0))
+    monkeypatch.setitem(Machine.components,
+                        0,
+                        dict(peer_table=peer_table,
+                             vote_slots=vote_slots,
+                             clock_sync=clock_sync,
+                             senders=[None, sender]))
+    peer_table.set_status(0, False)
+    vote_slots.put(0, 'vote')
+    clock_sync.received(1, 105.0, [0], [99.98], [104.99], t=100.01)
+
+    stats = Machine.stats(0)
+    assert set(stats['clocks']) == {1}
+    assert stats['clocks'][1]['offset'] == pytest.approx(5.0)
+    assert set(stats['locks']) == {'clock_sync', 'peer_table', 'vote_slots'}
+    assert stats['locks']['vote_slots']['acquisitions'] == 1
+    assert stats['peers'] == {1: dict(sent=1, dropped=0)}
+    assert Machine.stats(1) == dict(clocks={}, locks={}, peers={})
+
+    # only printed once it's been `STATS_INTERVAL`, if that isn't 0
+    assert Machine.report_stats(0, 0.0) == 0.0
+    monkeypatch.setattr(Config, 'STATS_INTERVAL', 1.0)
+    last_t = Machine.report_stats(0, 0.0)
+    assert last_t > 0.0
+    assert Machine.report_stats(0, last_t) == last_t
+    assert capsys.readouterr().out.startswith("[0] {'clocks': ")
+
+
+def test_leader_election_failover():
+    election = LeaderElection(3, timeout=0)
+    assert election.get_leader(2) == 0
+
+    # 0 misses a round, so 1 takes over
+    assert election.check_leader()
+    assert election.get_leader(2) == 1
+
+    # 1 decides, having only heard from 1 and 2
+    election.decided(1, [1, 2])
+    assert election.get_leader(2) == 1
+
+    # 0 is back, and decides
+    election.decided(0, [0, 1, 2])
+    assert election.get_leader(2) == 0
+
+
+@pytest.mark.parametrize('n,base', [(n, base)
+                                    for n in range(1, 40)
+                                    for base in (2, 3, 4)])
+def test_gossip_neighbors(n, base):
+    neighbors = [gossip_neighbors(idx, n, base) for idx in range(n)]
+    for idx in range(n):
+        assert idx not in neighbors[idx]
+        assert len(neighbors[idx]) <= 2 * (base - 1) * ceil(log(n, base) or 1)
+        assert all(idx in neighbors[other] for other in neighbors[idx])
+
+    # everyone is reached (from 0, by symmetry) within `ceil(log_base(n))`
+    hops = {0: 0}
+    frontier = [0]
+    while len(frontier) > 0:
+        idx = frontier.pop(0)
+        for other in neighbors[idx]:
+            if other not in hops:
+                hops[other] = hops[idx] + 1
+                frontier.append(other)
+    assert len(hops) == n
+    assert max(hops.values()) <= ceil(round(log(n, base), 9))
+
+
+def test_gossip_receive():
+    vote_slots = VoteSlots(4)
+    gossip_view = GossipView(4)
+    heartbeats = [HeartbeatRequest(channel_events_states=[],
+                                   machine_addresses=[],
+                                   sent_timestamp=float(t))
+                  for t in range(1, 4)]
+    data = GossipRequest(origins=[1, 2, 3],
+                         heartbeats=heartbeats).serialize()
+    assert type(BaseRequest.deserialize(data)) is GossipRequest
+
+    assert Machine.receive_request(1, data, vote_slots, VoteSlots(4),
+                                   FailureDetector(4), gossip_view)
+    assert vote_slots.full([1, 2, 3])
+    assert [origin for origin, _ in gossip_view.take_relay()] == [1, 2, 3]
+    assert gossip_view.take_votes() == heartbeats
+
+    # the same ones again (e.g. around the other way) aren't passed on
+    vote_slots.take()
+    assert Machine.receive_request(2, data, vote_slots, VoteSlots(4),
+                                   FailureDetector(4), gossip_view)
+    assert vote_slots.take() == [None] * 4
+    assert gossip_view.take_relay() == []
+    assert gossip_view.take_votes() == []
+
+
+def test_reactive_state_order():
+    def event(cls, timestamp):
+        return cls(channel_state=ChannelState(idx=1,
+                                              last_timestamp=0,
+                                              timestamp=timestamp,
+                                              playing=True,
+                                              volume=0.5))
+
+    # (clock, origin, event): a play, then a seek and a pause concurrently.
+    events = [(1, 0, event(PlayEvent, 1)),
+              (2, 1, event(SeekEvent, 2)),
+              (2, 2, event(PauseEvent, 3))]
+    at = set()
+    for order in permutations(events):
+        reactive_state = ReactiveState()
+        [reactive_state.merge(clock, origin, e, 0.0)
+         for clock, origin, e in order]
+        at.add(tuple((origin, e.get_event_code())
+                     for origin, e, _ in reactive_state.get_events(1)))
+    assert at == {((1, EventCode.SEEK.value), (2, EventCode.PAUSE.value))}
+
+    # and everything after them is later.
+    assert reactive_state.tick() == 3
+    assert not reactive_state.merge(1, 0, event(PlayEvent, 1), 0.0)
+    assert reactive_state.take_changed() == [1]
+    assert reactive_state.take_changed() == []
+    assert len(reactive_state.snapshot()) == 2
+
+
+def test_reactive_state_wait():
+    event_queue = EventQueue()
+    reactive_state = ReactiveState()
+    event_queue.listeners.append(reactive_state.notify)
+    assert not reactive_state.wait(0)
+
+    event_queue.append(None)
+    assert reactive_state.wait(0)
+    assert not reactive_state.wait(0)
+
+
+def test_decide_events_resent():
+    now = ClockSync.now()
+    # a pause (made while playing) at 30s, resent a minute later
+    pause = new_event(EventCode.PAUSE, 0, 30, True, 0.5)
+    (channel_state,) = Machine.decide_events([(pause, now - 60)])
+    assert not channel_state.get_playing()
+    assert channel_state.get_timestamp() == 30
+    assert pause.get_channel_state().get_timestamp() == 30
+
+    # but a play is as far along as it'd be by now
+    play = new_event(EventCode.PLAY, 0, 30, True, 0.5)
+    (channel_state,) = Machine.decide_events([(play, now - 60)])
+    assert channel_state.get_playing()
+    assert 90 <= channel_state.get_timestamp() < 91
+
+
+def test_event_request():
+    request = EventRequest(
+        events=[PlayEvent(channel_state=ChannelState(idx=0,
+                                                     last_timestamp=1,
+                                                     timestamp=2,
+                                                     playing=True,
+                                                     volume=0.5))],
+        clocks=[3],
+        origins=[1],
+        sent_timestamps=[4.5]
+    )
+    data = request.serialize()
+    assert type(BaseRequest.deserialize(data)) is EventRequest
+    assert BaseRequest.deserialize(data) == request
+
+
+# MARK: - `LocalMusicStreamer` tests
+
+
+@pytest.fixture
+def mixer(monkeypatch):
+    """`pygame.mixer` on the dummy audio driver, from where the chunks are.
+    """
+    monkeypatch.chdir(Path(__file__).parent.parent)
+    if pygame.mixer.get_init() is None:
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        pygame.mixer.init()
+        pygame.mixer.set_num_channels(len(Config.CHANNELS) + 1)
+
+
+def test_streamer_is_synced(mixer):
+    streamer = LocalMusicStreamer(0)
+
+    def state(last_timestamp, timestamp, playing):
+        return ChannelState(idx=0,
+                            last_timestamp=last_timestamp,
+                            timestamp=timestamp,
+                            playing=playing,
+                            volume=streamer.get_volume())
+
+    # while paused, both times are compared, within tolerance
+    assert streamer.is_synced(state(0.005, 0.005, False))
+    assert not streamer.is_synced(state(1.0, 0.0, False))
+    assert not streamer.is_synced(state(0.0, 1.0, False))
+
+    # while playing, the last time moves along every round, so it's not
+    streamer.sync(state(0.0, 0.0, True))
+    assert streamer.is_playing()
+    assert streamer.is_synced(state(0.25, streamer.get_current_time(), True))
+    assert not streamer.is_synced(
+        state(0.25, streamer.get_current_time() + 0.5, True))
+    assert not streamer.is_synced(state(0.25, 0.25, False))
+
+
+def test_streamer_seek_within(mixer):
+    streamer = LocalMusicStreamer(0)
+    length = Config.CHANNELS[0][2]
+    frequency, _, _ = pygame.mixer.get_init()
+
+    # the rest of the chunk, to the sample
+    sound = streamer.get_chunk_from(2, 0.5)
+    assert sound.get_length() == pytest.approx(length - 0.5,
+                                               abs=2 / frequency)
+    assert streamer.get_chunk_from(2, 0) is streamer.get_chunk(2)
+
+    assert streamer.seek_within(2, 0.5, False)
+    assert not streamer.is_seeking()
+    assert streamer.get_current_time() == pytest.approx(length + 0.5)
+    assert (pygame.mixer.Channel(0).get_sound().get_length() ==
+            pytest.approx(length - 0.5, abs=2 / frequency))
+    assert not streamer.seek_within(Config.CHANNELS[0][1] + 1, 0.5, False)
+
+
+def test_streamer_seek_within_unavailable(mixer, monkeypatch):
+    streamer = LocalMusicStreamer(0)
+    monkeypatch.setattr(streamer, 'get_chunk', lambda chunk: None)
+
+    # so it waits for the next chunk, like before
+    streamer.sync(ChannelState(idx=0,
+                               last_timestamp=0.0,
+                               timestamp=2.0,
+                               playing=True,
+                               volume=streamer.get_volume()))
+    try:
+        assert streamer.is_seeking()
+        assert not streamer.is_playing()
+    finally:
+        streamer.timer.cancel()
+
+
+def test_streamer_pause_part_way(mixer):
+    streamer = LocalMusicStreamer(0)
+    length = Config.CHANNELS[0][2]
+
+    def sync(playing):
+        streamer.sync(ChannelState(idx=0,
+                                   last_timestamp=0.0,
+                                   timestamp=streamer.get_current_time(),
+                                   playing=playing,
+                                   volume=streamer.get_volume()))
+        assert streamer.is_playing() == playing
+
+    assert streamer.seek_within(2, 0.5, True)
+    sleep(0.05)
+    sync(False)
+    paused_at = streamer.get_current_time()
+    assert length + 0.55 <= paused_at < length + 0.9
+
+    # it's where it was paused, and carries on from there
+    sleep(0.05)
+    assert streamer.get_current_time() == paused_at
+    sync(True)
+    sleep(0.05)
+    sync(False)
+    assert paused_at + 0.05 <= streamer.get_current_time() < paused_at + 0.4
+
+
+def test_streamer_drift_correction(mixer, monkeypatch):
+    # numpy is never used unless it's correcting
+    monkeypatch.setattr(synfony.streamer, 'numpy', object())
+    streamer = LocalMusicStreamer(0)
+
+    def sync(ahead):
+        streamer.sync(ChannelState(idx=0,
+                                   last_timestamp=0.0,
+                                   timestamp=(streamer.get_current_time() +
+                                              ahead),
+                                   playing=True,
+                                   volume=streamer.get_volume()))
+
+    sync(0)
+    chunk_ended = pygame.event.Event(pygame.USEREVENT + 0)
+
+    # which is off by default, so it reseeks, and doesn't resample
+    sync(0.05)
+    for _ in range(3):
+        streamer.event(chunk_ended)
+        assert streamer.rate == 1.0
+        assert streamer.drift == 0.0
+
+    # but once it's on, it keeps track of the drift, until it's close enough
+    monkeypatch.setattr(Config, 'DRIFT_CORRECTION_ENABLED', True)
+    sync(0.05)
+    assert not streamer.is_seeking()
+    assert streamer.drift == pytest.approx(0.05, abs=0.005)
+    assert not streamer.is_synced(
+        ChannelState(idx=0,
+                     last_timestamp=0.0,
+                     timestamp=streamer.get_current_time(),
+                     playing=True,
+                     volume=streamer.get_volume()))
+    sync(0)
+    assert streamer.drift == 0.0
+
+
+# MARK: - `AsyncMachine` tests
+
+
+def test_async_read_frame():
+    async def impl_test():
+        reader = asyncio.StreamReader()
+        reader.feed_data(FrameDecoder.encode(b'first') +
+                         FrameDecoder.encode(b'second')[:3])
+        assert await AsyncMachine.read_frame(reader) == b'first'
+
+        reader.feed_data(FrameDecoder.encode(b'second')[3:])
+        reader.feed_eof()
+        assert await AsyncMachine.read_frame(reader) == b'second'
+
+        with pytest.raises(asyncio.IncompleteReadError):
+            await AsyncMachine.read_frame(reader)
+
+    asyncio.run(impl_test())
+
+
+def test_async_metronome_timeout(monkeypatch):
+    monkeypatch.setattr(Config, 'HANDSHAKE_INTERVAL', 0)
+    machine_addresses = [MachineAddress(host='localhost',
+                                        idx=i,
+                                        port=10000 * (i + 1),
+                                        status=True)
+                         for i in range(2)]
+    ui_manager = SimpleNamespace(event_queue=EventQueue(),
+                                 streamers=[],
+                                 stop_loading=lambda: None)
+
+    async def impl_round(votes):
+        start_t = monotonic()
+        await AsyncMachine.async_metronome(0,
+                                           {},
+                                           machine_addresses,
+                                           ui_manager,
+                                           votes,
+                                           asyncio.Event())
+        return monotonic() - start_t
+
+    # without the other's vote, (2) waits until it times out, and then
+    # that guy is down.
+    assert asyncio.run(impl_round({})) >= Config.HEARTBEAT_TIMEOUT
+    assert not machine_addresses[1].get_status()
+
+    # but ends as soon as every vote is in.
+    votes = {1: HeartbeatRequest(channel_events_states=[],
+                                 machine_addresses=[],
+                                 sent_timestamp=ClockSync.now())}
+    assert asyncio.run(impl_round(votes)) < Config.HEARTBEAT_TIMEOUT / 2
+    assert len(votes) == 0
+
+
+def test_async_machine_loopback():
+    """An `AsyncMachine` and a (threaded) `Machine`, on loopback, both apply
+        the same decision on an event of the `AsyncMachine`'s.
+    """
+    class Stopped(Exception):
+        pass
+
+    class LoopbackEventQueue(EventQueue):
+        stopped = False
+
+        def __iter__(self):
+            # so the `Machine`'s `networking` ends.
+            if self.stopped:
+                raise Stopped()
+            return super().__iter__()
+
+    class LoopbackStreamer:
+        def __init__(self):
+            self.playing = False
+            self.synced = Event()
+            self.state = None
+
+        def get_last_time(self):
+            return 0.0
+
+        def get_current_time(self):
+            return 0.0
+
+        def get_volume(self):
+            return 0.5
+
+        def is_playing(self):
+            return self.playing
+
+        def is_synced(self, state):
+            return self.playing == state.get_playing()
+
+        def sync(self, state):
+            self.playing = state.get_playing()
+            self.state = state
+            self.synced.set()
+
+    def free_port():
+        s = FramedTCPSockets.start_socket(
+            machine_address=MachineAddress(host='127.0.0.1', port=0),
+            bind=True)
+        port = s.getsockname()[1]
+        FramedTCPSockets.close(s)
+        return port
+
+    def loopback_ui():
+        return SimpleNamespace(event_queue=LoopbackEventQueue(),
+                               streamers=[LoopbackStreamer()],
+                               stop_loading=lambda: None)
+
+    ports = [free_port(), free_port()]
+    machine_addresses = [[MachineAddress(host='127.0.0.1',
+                                         idx=i,
+                                         port=port,
+                                         status=(i == idx))
+                          for i, port in enumerate(ports)]
+                         for idx in range(2)]
+    ui_managers = [loopback_ui(), loopback_ui()]
+
+    async_stopped = Event()
+
+    async def async_networking():
+        task = asyncio.ensure_future(
+            AsyncMachine.async_networking(0,
+                                          machine_addresses[0],
+                                          ui_managers[0],
+                                          ChannelState.choice_func))
+        await asyncio.to_thread(async_stopped.wait)
+        task.cancel()
+
+    async_thread = Thread(target=asyncio.run,
+                          args=[async_networking()],
+                          daemon=True)
+    async_thread.start()
+
+    def networking():
+        try:
+            Machine.networking(1, machine_addresses[1], ui_managers[1])
+        except Stopped:
+            pass
+
+    thread = Thread(target=networking, daemon=True)
+    thread.start()
+    try:
+        # once each has the other's vote (and the `Machine` has started).
+        deadline = monotonic() + 5 * Config.TIMEOUT
+        while (monotonic() < deadline and
+               not (machine_addresses[0][1].get_status() and
+                    1 in Machine.components and
+                    Machine.components[1]['peer_table'].get_status(0))):
+            sleep(Config.HANDSHAKE_INTERVAL)
+        assert machine_addresses[0][1].get_status()
+
+        ui_managers[0].event_queue.append(
+            new_event(EventCode.PLAY, 0, 0, True, 0.5))
+        assert all(ui_manager.streamers[0].synced.wait(5 * Config.TIMEOUT)
+                   for ui_manager in ui_managers)
 
+        async_state, state = [ui_manager.streamers[0].state
+                              for ui_manager in ui_managers]
+        assert async_state.get_idx() == state.get_idx() == 0
+        assert async_state.get_playing() and state.get_playing()
+        assert async_state.get_volume() == state.get_volume() == 0.5
+        assert async_state.get_timestamp() == pytest.approx(
+            state.get_timestamp(), abs=Config.HEARTBEAT_TIMEOUT)
 
-# TODO: I'm thinking just the simple peeking + deserialize functionality
+        # and the `Machine`'s heartbeats were sent to the `AsyncMachine`
+        assert Machine.stats(1)['peers'][0]['sent'] > 0
+    finally:
+        ui_managers[1].event_queue.stopped = True
+        thread.join(5 * Config.TIMEOUT)
+        async_stopped.set()
+        async_thread.join(Config.TIMEOUT)
+    assert not thread.is_alive()
+    assert not async_thread.is_alive()
+    assert 1 not in Machine.components
 
 
 # MARK: - `metronome` tests... or do these belong in integration_tests?